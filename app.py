@@ -1,14 +1,43 @@
 from dataclasses import dataclass
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
+import hashlib
+import os
 import sqlite3
+import threading
+import time
 from flask import Flask, jsonify, render_template, request
 
+from backend.app import events, money
+import tickets
+
 DB_PATH = "/tmp/orders.db"
 TAX_RATE = 0.0825
+DB_PROFILE = os.environ.get("DB_PROFILE", "production")
+STATEMENT_CACHE_SIZE = 256
+PRINT_JOB_PAYLOAD_DAYS = int(os.environ.get("PRINT_JOB_PAYLOAD_DAYS", 7))
+PRINT_JOB_ARCHIVE_DAYS = int(os.environ.get("PRINT_JOB_ARCHIVE_DAYS", 90))
+EVENT_BUFFER_SIZE = 1000
+EVENT_HEARTBEAT_SECONDS = 15
+PRINT_JOB_WATCH_INTERVAL = 0.5
+DEFAULT_PRINTER_PORT = 9100
+
+SQLITE_PRAGMAS = {
+    "default": [
+        "PRAGMA foreign_keys = ON",
+    ],
+    "production": [
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA temp_store = MEMORY",
+    ],
+}
 
 app = Flask(__name__)
-app.config.setdefault("DB_INITIALIZED", False)
+event_bus = events.EventBus(EVENT_BUFFER_SIZE)
 
 
 @dataclass
@@ -19,6 +48,7 @@ class MenuItem:
     price: float
     category: str
     tags: list[str]
+    name_chinese: str | None = None
 
 
 MENU_ITEMS = [
@@ -29,6 +59,7 @@ MENU_ITEMS = [
         7.5,
         "Dimsum",
         ["seafood"],
+        "蝦餃",
     ),
     MenuItem(
         "DS-02",
@@ -37,6 +68,7 @@ MENU_ITEMS = [
         6.75,
         "Dimsum",
         [],
+        "燒賣",
     ),
     MenuItem(
         "DS-03",
@@ -45,6 +77,7 @@ MENU_ITEMS = [
         5.25,
         "Dimsum",
         ["vegetarian"],
+        "素春卷",
     ),
     MenuItem(
         "LN-01",
@@ -53,6 +86,7 @@ MENU_ITEMS = [
         12.5,
         "Lunch",
         ["spicy"],
+        "宮保雞丁",
     ),
     MenuItem(
         "LN-02",
@@ -61,6 +95,7 @@ MENU_ITEMS = [
         13.25,
         "Lunch",
         [],
+        "乾炒牛河",
     ),
     MenuItem(
         "LN-03",
@@ -69,6 +104,7 @@ MENU_ITEMS = [
         11.0,
         "Lunch",
         ["spicy", "vegetarian"],
+        "麻婆豆腐",
     ),
     MenuItem(
         "DN-01",
@@ -77,6 +113,7 @@ MENU_ITEMS = [
         28.0,
         "Dinner",
         [],
+        "北京烤鴨",
     ),
     MenuItem(
         "DN-02",
@@ -85,6 +122,7 @@ MENU_ITEMS = [
         16.5,
         "Dinner",
         ["seafood"],
+        "海鮮炒飯",
     ),
     MenuItem(
         "DN-03",
@@ -93,20 +131,43 @@ MENU_ITEMS = [
         14.25,
         "Dinner",
         ["spicy", "vegetarian"],
+        "魚香茄子",
     ),
 ]
 
 
+_local = threading.local()
+
+MENU_BY_SKU = {item.sku: item for item in MENU_ITEMS}
+
+
 def connect_db():
-    connection = sqlite3.connect(DB_PATH)
+    connection = sqlite3.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE)
     connection.row_factory = sqlite3.Row
-    connection.execute("PRAGMA foreign_keys = ON")
+    for pragma in SQLITE_PRAGMAS[DB_PROFILE]:
+        connection.execute(pragma)
     return connection
 
 
-def init_db():
-    connection = connect_db()
-    cursor = connection.cursor()
+def get_db():
+    """Return this thread's connection, opening it on first use."""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = connect_db()
+        _local.connection = connection
+    return connection
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    # Keep the connection for the next request on this thread, but never
+    # let an uncommitted transaction leak into it.
+    connection = getattr(_local, "connection", None)
+    if connection is not None and connection.in_transaction:
+        connection.rollback()
+
+
+def migration_001_initial_schema(cursor):
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS orders (
@@ -209,8 +270,106 @@ def init_db():
         """
     )
     ensure_printer_mapping_row(cursor)
-    connection.commit()
-    connection.close()
+
+
+def migration_002_print_job_delivery(cursor):
+    ensure_column(cursor, "print_jobs", "attempts", "INTEGER NOT NULL DEFAULT 0")
+    ensure_column(cursor, "print_jobs", "next_attempt_at", "TEXT")
+    ensure_column(cursor, "print_jobs", "last_error", "TEXT")
+    ensure_column(cursor, "print_jobs", "completed_at", "TEXT")
+
+
+def migration_003_print_routes(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS print_routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            match_type TEXT NOT NULL,
+            match_value TEXT NOT NULL,
+            station TEXT NOT NULL,
+            printer_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE(match_type, match_value),
+            FOREIGN KEY(printer_id) REFERENCES printers(id)
+        )
+        """
+    )
+
+
+def migration_004_print_job_retention(cursor):
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_print_jobs_status_created_at
+        ON print_jobs (status, created_at)
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS print_jobs_archive (
+            id INTEGER PRIMARY KEY,
+            order_id INTEGER,
+            payment_id INTEGER,
+            printer_id INTEGER NOT NULL,
+            job_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            completed_at TEXT,
+            archived_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def migration_005_close_driver_print_jobs(cursor):
+    # Only ESC/POS printers are dispatched; driver jobs would stay queued forever
+    cursor.execute(
+        """
+        UPDATE print_jobs
+        SET status = 'failed', last_error = 'Driver printers are not dispatched'
+        WHERE status IN ('queued', 'printing')
+            AND printer_id IN (SELECT id FROM printers WHERE connection_type = 'driver')
+        """
+    )
+
+
+# Applied in order; the database records how many have run in PRAGMA user_version.
+MIGRATIONS = [
+    migration_001_initial_schema,
+    migration_002_print_job_delivery,
+    migration_003_print_routes,
+    migration_004_print_job_retention,
+    migration_005_close_driver_print_jobs,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db():
+    connection = connect_db()
+    try:
+        if schema_version(connection) >= SCHEMA_VERSION:
+            return
+        # BEGIN IMMEDIATE takes the write lock, so concurrently starting
+        # workers queue here and then find the schema already current.
+        connection.isolation_level = None
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(connection)
+            cursor = connection.cursor()
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
 
 
 def ensure_column(cursor, table_name, column_name, column_type):
@@ -235,16 +394,6 @@ def ensure_printer_mapping_row(cursor):
         )
 
 
-def fetch_order_details(cursor, order_id):
-    cursor.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
-    order = cursor.fetchone()
-    if not order:
-        return None, []
-    cursor.execute("SELECT * FROM order_items WHERE order_id = ?", (order_id,))
-    items = [dict(row) for row in cursor.fetchall()]
-    return dict(order), items
-
-
 def fetch_printer_mapping(cursor):
     cursor.execute(
         "SELECT kitchen_printer_id, receipt_printer_id FROM printer_mappings LIMIT 1"
@@ -253,78 +402,101 @@ def fetch_printer_mapping(cursor):
     return dict(mapping) if mapping else {"kitchen_printer_id": None, "receipt_printer_id": None}
 
 
-def fetch_printer(cursor, printer_id):
-    if not printer_id:
-        return None
-    cursor.execute("SELECT * FROM printers WHERE id = ?", (printer_id,))
-    row = cursor.fetchone()
-    return dict(row) if row else None
+def ticket_header(title):
+    return (
+        tickets.text(title, bold=True, tall=True, center=True),
+        tickets.text("Order #{id} · {ticket_label}", bold=True),
+        tickets.when("table_label", tickets.text("Table/Label: {table_label}", tall=True)),
+        tickets.when("delivery_address", tickets.text("Address: {delivery_address}")),
+        tickets.when("delivery_contact", tickets.text("Contact: {delivery_contact}")),
+        tickets.text("Placed: {created_at}"),
+        tickets.blank(),
+    )
 
 
-def format_ticket_header(title, order):
-    lines = [
-        title,
-        f"Order #{order['id']} · {order['ticket_type'].replace('-', ' ').title()}",
-    ]
-    if order.get("table_label"):
-        lines.append(f"Table/Label: {order['table_label']}")
-    if order.get("delivery_address"):
-        lines.append(f"Address: {order['delivery_address']}")
-    if order.get("delivery_contact"):
-        lines.append(f"Contact: {order['delivery_contact']}")
-    lines.append(f"Placed: {order['created_at']}")
-    return "\n".join(lines)
-
-
-def build_kitchen_ticket(order, items):
-    header = format_ticket_header("KITCHEN TICKET", order)
-    lines = [header, "", "Items:"]
-    for item in items:
-        lines.append(f"- {item['quantity']} x {item['name']}")
-    lines.append("")
-    lines.append("Notes: __________________________________")
-    return "\n".join(lines)
+KITCHEN_TICKET = tickets.Template(
+    *ticket_header("{station_label} TICKET"),
+    tickets.text("Items:"),
+    tickets.each(
+        "items",
+        tickets.text("{quantity} x {name}", bold=True, tall=True),
+        tickets.chinese("name_chinese", indent=4, tall=True),
+    ),
+    tickets.blank(),
+    tickets.text("Notes: __________________________________"),
+)
+
+CUSTOMER_RECEIPT = tickets.Template(
+    *ticket_header("CUSTOMER RECEIPT"),
+    tickets.each(
+        "items",
+        tickets.columns("{quantity} x {name} @ ${price:.2f}", "${line_total:.2f}"),
+        tickets.chinese("name_chinese", indent=4),
+    ),
+    tickets.rule(),
+    tickets.columns("Subtotal", "${subtotal:.2f}"),
+    tickets.columns("Tax", "${tax:.2f}"),
+    tickets.columns("Tip", "${tip:.2f}"),
+    tickets.columns("Discount", "-${discount:.2f}"),
+    tickets.columns("Total", "${total:.2f}", bold=True, tall=True),
+    tickets.section(
+        "payment",
+        tickets.blank(),
+        tickets.columns("Payment Method", "{method_label}"),
+        tickets.columns("Amount Tendered", "${amount_tendered:.2f}"),
+        tickets.columns("Change Due", "${change_due:.2f}"),
+        tickets.columns("Status", "{status}"),
+    ),
+)
 
 
-def build_customer_receipt(order, items, payment):
-    header = format_ticket_header("CUSTOMER RECEIPT", order)
-    lines = [header, "", "Items:"]
+def ticket_context(order, items, payment=None):
+    context = dict(order)
+    context["ticket_label"] = order["ticket_type"].replace("-", " ").title()
+    context["items"] = []
     for item in items:
-        line_total = item["price"] * item["quantity"]
-        lines.append(
-            f"- {item['name']} ({item['quantity']} @ ${item['price']:.2f}) = ${line_total:.2f}"
+        menu_item = MENU_BY_SKU.get(item["sku"])
+        context["items"].append(
+            {
+                **item,
+                "name_chinese": menu_item.name_chinese if menu_item else None,
+                "line_total": money.to_amount(
+                    money.line_cents(item["price"], item["quantity"])
+                ),
+            }
         )
-    lines.extend(
-        [
-            "",
-            f"Subtotal: ${order['subtotal']:.2f}",
-            f"Tax: ${order['tax']:.2f}",
-            f"Tip: ${order['tip']:.2f}",
-            f"Discount: -${order['discount']:.2f}",
-            f"Total: ${order['total']:.2f}",
-        ]
-    )
     if payment:
-        lines.extend(
-            [
-                "",
-                f"Payment Method: {payment['method'].title()}",
-                f"Amount Tendered: ${payment['amount_tendered']:.2f}",
-                f"Change Due: ${payment['change_due']:.2f}",
-                f"Status: {payment['status']}",
-            ]
-        )
-    return "\n".join(lines)
+        context["payment"] = {**payment, "method_label": payment["method"].title()}
+    return context
+
+
+def parse_printer_address(device_identifier):
+    """Split an ESC/POS device identifier of the form host[:port]."""
+    address = device_identifier.strip()
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        host, port = address, DEFAULT_PRINTER_PORT
+    port = int(port)
+    if not host or any(char.isspace() for char in host) or not 0 < port < 65536:
+        raise ValueError(f"invalid printer address: {device_identifier!r}")
+    return host, port
+
+
+def is_dispatched(printer):
+    """Only network ESC/POS printers have a dispatcher delivering their jobs."""
+    return printer is not None and printer["connection_type"] == "escpos"
+
 
+DISPATCHED_PRINTER_REQUIRED = "Tickets can only be sent to ESC/POS network printers."
 
-def format_print_payload(printer, content):
-    if printer["connection_type"] == "escpos":
-        return f"\x1b@\n{content}\n\n\x1dV\x00"
-    return content
+
+def render_print_payload(printer, template, context):
+    return tickets.render_bytes(
+        template, context, escpos=printer["connection_type"] == "escpos"
+    )
 
 
-def queue_print_job(connection, order_id, payment_id, job_type, printer, content):
-    payload = format_print_payload(printer, content)
+def queue_print_job(connection, order_id, payment_id, job_type, printer, payload):
     cursor = connection.cursor()
     cursor.execute(
         """
@@ -345,40 +517,295 @@ def queue_print_job(connection, order_id, payment_id, job_type, printer, content
     return cursor.lastrowid
 
 
-def queue_kitchen_ticket(connection, order_id):
-    cursor = connection.cursor()
+PRINT_ROUTE_MATCH_TYPES = ("tag", "category")
+DEFAULT_STATION = "kitchen"
+
+
+def fetch_print_routes(cursor):
+    cursor.execute(
+        """
+        SELECT print_routes.*, printers.name AS printer_name
+        FROM print_routes
+        JOIN printers ON printers.id = print_routes.printer_id
+        ORDER BY match_type, match_value
+        """
+    )
+    return [dict(row) for row in cursor.fetchall()]
+
+
+PRINTER_CONFIG_TTL = 30
+
+
+@dataclass(frozen=True)
+class PrinterConfig:
+    printers: dict
+    kitchen_printer_id: int | None
+    receipt_printer_id: int | None
+    routes: dict
+
+
+_printer_config = None
+_printer_config_version = 0
+_printer_config_lock = threading.Lock()
+
+
+def load_printer_config(cursor):
+    cursor.execute("SELECT * FROM printers")
+    printers = {row["id"]: dict(row) for row in cursor.fetchall()}
     mapping = fetch_printer_mapping(cursor)
-    printer = fetch_printer(cursor, mapping.get("kitchen_printer_id"))
-    if not printer:
-        return None
-    order, items = fetch_order_details(cursor, order_id)
-    if not order:
-        return None
-    content = build_kitchen_ticket(order, items)
-    return queue_print_job(connection, order_id, None, "kitchen", printer, content)
+    # A route to a printer nothing dispatches to is ignored, so its items
+    # fall through to the next route or the kitchen printer
+    routes = {
+        (route["match_type"], route["match_value"]): route
+        for route in fetch_print_routes(cursor)
+        if is_dispatched(printers.get(route["printer_id"]))
+    }
+    return PrinterConfig(
+        printers,
+        mapping["kitchen_printer_id"],
+        mapping["receipt_printer_id"],
+        routes,
+    )
+
+
+def printer_config(cursor):
+    """Printers, mapping and routes, cached until a printer write or the TTL."""
+    global _printer_config
+    cached = _printer_config
+    now = time.monotonic()
+    if cached and now - cached[0] < PRINTER_CONFIG_TTL:
+        return cached[1]
+    with _printer_config_lock:
+        version = _printer_config_version
+    config = load_printer_config(cursor)
+    with _printer_config_lock:
+        # Don't cache a load that raced with a printer write
+        if version == _printer_config_version:
+            _printer_config = (now, config)
+    return config
+
+
+def invalidate_printer_config():
+    """Call after committing a change to printers, mappings or routes."""
+    global _printer_config, _printer_config_version
+    with _printer_config_lock:
+        _printer_config_version += 1
+        _printer_config = None
+
+
+def route_items(routes, items, default_printer_id):
+    """Group order items by (station, printer) in one pass.
+
+    Tag routes win over category routes; anything unrouted goes to the
+    default kitchen printer, or is dropped when none is configured.
+    """
+    tickets_by_station = {}
+    for item in items:
+        menu_item = MENU_BY_SKU.get(item["sku"])
+        route = None
+        if menu_item:
+            for tag in menu_item.tags:
+                route = routes.get(("tag", tag))
+                if route:
+                    break
+            else:
+                route = routes.get(("category", menu_item.category))
+        if route:
+            key = (route["station"], route["printer_id"])
+        elif default_printer_id:
+            key = (DEFAULT_STATION, default_printer_id)
+        else:
+            continue
+        tickets_by_station.setdefault(key, []).append(item)
+    return tickets_by_station
+
+
+def queue_station_tickets(connection, order, items):
+    """Queue one ticket per station printer; returns the print job ids."""
+    config = printer_config(connection.cursor())
+    routed = route_items(config.routes, items, config.kitchen_printer_id)
+    job_ids = []
+    for (station, printer_id), station_items in routed.items():
+        printer = config.printers.get(printer_id)
+        if not is_dispatched(printer):
+            continue
+        context = ticket_context(order, station_items)
+        context["station_label"] = station.replace("-", " ").upper()
+        payload = render_print_payload(printer, KITCHEN_TICKET, context)
+        job_ids.append(
+            queue_print_job(connection, order["id"], None, station, printer, payload)
+        )
+    return job_ids
 
 
-def queue_receipt(connection, order_id, payment_id):
+def queue_receipt(connection, order, payment):
     cursor = connection.cursor()
-    mapping = fetch_printer_mapping(cursor)
-    printer = fetch_printer(cursor, mapping.get("receipt_printer_id"))
-    if not printer:
-        return None
-    order, items = fetch_order_details(cursor, order_id)
-    if not order:
+    config = printer_config(cursor)
+    printer = config.printers.get(config.receipt_printer_id)
+    if not is_dispatched(printer):
         return None
-    cursor.execute("SELECT * FROM payments WHERE id = ?", (payment_id,))
-    payment = cursor.fetchone()
-    payment_data = dict(payment) if payment else None
-    content = build_customer_receipt(order, items, payment_data)
-    return queue_print_job(connection, order_id, payment_id, "receipt", printer, content)
+    cursor.execute("SELECT * FROM order_items WHERE order_id = ?", (order["id"],))
+    items = [dict(row) for row in cursor.fetchall()]
+    payload = render_print_payload(
+        printer, CUSTOMER_RECEIPT, ticket_context(order, items, payment)
+    )
+    return queue_print_job(
+        connection, order["id"], payment["id"], "receipt", printer, payload
+    )
+
+
+ARCHIVED_PRINT_JOB_COLUMNS = (
+    "id, order_id, payment_id, printer_id, job_type, status, attempts, "
+    "last_error, created_at, completed_at"
+)
+
+
+def compact_print_jobs(
+    connection,
+    payload_days=PRINT_JOB_PAYLOAD_DAYS,
+    archive_days=PRINT_JOB_ARCHIVE_DAYS,
+    batch_size=500,
+):
+    """Drop old completed payloads, then move old finished jobs to the archive.
+
+    Works in short batches so the dispatcher and the app are never locked
+    out for long. Returns (payloads_cleared, jobs_archived).
+    """
+    now = datetime.utcnow()
+    payload_cutoff = (now - timedelta(days=payload_days)).isoformat()
+    archive_cutoff = (now - timedelta(days=archive_days)).isoformat()
+
+    cleared = 0
+    while True:
+        cursor = connection.execute(
+            """
+            UPDATE print_jobs SET payload = X''
+            WHERE id IN (
+                SELECT id FROM print_jobs
+                WHERE status = 'completed' AND created_at < ? AND length(payload) > 0
+                LIMIT ?
+            )
+            """,
+            (payload_cutoff, batch_size),
+        )
+        connection.commit()
+        cleared += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+
+    archived = 0
+    while True:
+        ids = [
+            row["id"]
+            for row in connection.execute(
+                """
+                SELECT id FROM print_jobs
+                WHERE status IN ('completed', 'failed') AND created_at < ?
+                LIMIT ?
+                """,
+                (archive_cutoff, batch_size),
+            )
+        ]
+        if not ids:
+            break
+        placeholders = ", ".join("?" * len(ids))
+        connection.execute(
+            f"""
+            INSERT OR REPLACE INTO print_jobs_archive ({ARCHIVED_PRINT_JOB_COLUMNS}, archived_at)
+            SELECT {ARCHIVED_PRINT_JOB_COLUMNS}, ? FROM print_jobs WHERE id IN ({placeholders})
+            """,
+            (now.isoformat(), *ids),
+        )
+        connection.execute(f"DELETE FROM print_jobs WHERE id IN ({placeholders})", ids)
+        connection.commit()
+        archived += len(ids)
+    return cleared, archived
+
+
+PRINT_JOB_EVENT_QUERY = """
+    SELECT
+        print_jobs.id, print_jobs.order_id, print_jobs.payment_id,
+        print_jobs.printer_id, print_jobs.job_type, print_jobs.status,
+        print_jobs.created_at, print_jobs.attempts, print_jobs.last_error,
+        print_jobs.completed_at, printers.name AS printer_name
+    FROM print_jobs
+    JOIN printers ON printers.id = print_jobs.printer_id
+"""
+
+
+class PrintJobWatcher(threading.Thread):
+    """Publish print job changes, including those made by the dispatcher.
+
+    Only looks at the table when PRAGMA data_version says another
+    connection has committed, and then only at new jobs, active jobs and
+    jobs that were active last time, all of which are index lookups.
+    """
+
+    def __init__(self, bus):
+        super().__init__(name="print-job-watcher", daemon=True)
+        self.bus = bus
+
+    def run(self):
+        connection = connect_db()
+        data_version = None
+        last_id = self.max_job_id(connection)
+        known = {job["id"]: job["status"] for job in self.active_jobs(connection)}
+        while True:
+            version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if version != data_version:
+                data_version = version
+                known, last_id = self.poll(connection, known, last_id)
+            time.sleep(PRINT_JOB_WATCH_INTERVAL)
+
+    def max_job_id(self, connection):
+        return connection.execute("SELECT COALESCE(MAX(id), 0) FROM print_jobs").fetchone()[0]
+
+    def active_jobs(self, connection):
+        rows = connection.execute(
+            PRINT_JOB_EVENT_QUERY
+            + " WHERE print_jobs.status IN ('queued', 'printing')"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def poll(self, connection, known, last_id):
+        jobs = {job["id"]: job for job in self.active_jobs(connection)}
+        rows = connection.execute(
+            PRINT_JOB_EVENT_QUERY + " WHERE print_jobs.id > ?", (last_id,)
+        ).fetchall()
+        jobs.update((row["id"], dict(row)) for row in rows)
+        finished = [job_id for job_id in known if job_id not in jobs]
+        if finished:
+            placeholders = ", ".join("?" * len(finished))
+            rows = connection.execute(
+                PRINT_JOB_EVENT_QUERY + f" WHERE print_jobs.id IN ({placeholders})",
+                finished,
+            ).fetchall()
+            jobs.update((row["id"], dict(row)) for row in rows)
+        for job_id in sorted(jobs):
+            job = jobs[job_id]
+            if known.get(job_id) != job["status"]:
+                self.bus.publish("print_job.updated", job)
+        active = {
+            job_id: job["status"]
+            for job_id, job in jobs.items()
+            if job["status"] in ("queued", "printing")
+        }
+        return active, max([last_id, *jobs])
 
 
-@app.before_request
-def setup_database():
-    if not app.config["DB_INITIALIZED"]:
-        init_db()
-        app.config["DB_INITIALIZED"] = True
+_print_job_watcher = None
+_print_job_watcher_lock = threading.Lock()
+
+
+def start_print_job_watcher():
+    global _print_job_watcher
+    with _print_job_watcher_lock:
+        if _print_job_watcher is None:
+            _print_job_watcher = PrintJobWatcher(event_bus)
+            _print_job_watcher.start()
+
+
+init_db()
 
 
 @app.route("/")
@@ -386,21 +813,38 @@ def index():
     return render_template("index.html", tax_rate=TAX_RATE)
 
 
+_menu_snapshot = None
+
+
+def menu_snapshot():
+    """Serialized menu and its ETag, built once since MENU_ITEMS is static."""
+    global _menu_snapshot
+    if _menu_snapshot is None:
+        categories = {}
+        for item in MENU_ITEMS:
+            categories.setdefault(item.category, []).append(
+                {
+                    "sku": item.sku,
+                    "name": item.name,
+                    "description": item.description,
+                    "price": item.price,
+                    "category": item.category,
+                    "tags": item.tags,
+                }
+            )
+        body = app.json.dumps({"categories": categories})
+        etag = hashlib.sha256(body.encode()).hexdigest()[:32]
+        _menu_snapshot = (body, etag)
+    return _menu_snapshot
+
+
 @app.route("/api/menu")
 def menu():
-    categories = {}
-    for item in MENU_ITEMS:
-        categories.setdefault(item.category, []).append(
-            {
-                "sku": item.sku,
-                "name": item.name,
-                "description": item.description,
-                "price": item.price,
-                "category": item.category,
-                "tags": item.tags,
-            }
-        )
-    return jsonify({"categories": categories})
+    body, etag = menu_snapshot()
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @app.route("/api/orders", methods=["POST"])
@@ -427,33 +871,61 @@ def create_order():
     if not items:
         return jsonify({"error": "At least one item is required."}), 400
 
-    subtotal = sum(item["price"] * item["quantity"] for item in items)
-    tax = round(subtotal * TAX_RATE, 2)
-    total = round(subtotal + tax + tip - discount, 2)
+    # Price lines from the menu; only the SKU and quantity come from the client
+    lines = []
+    for item in items:
+        menu_item = MENU_BY_SKU.get(item.get("sku"))
+        if not menu_item:
+            return jsonify({"error": f"Unknown menu item: {item.get('sku')}."}), 400
+        quantity = item.get("quantity")
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return jsonify({"error": f"Quantity for {menu_item.name} is invalid."}), 400
+        lines.append(
+            {
+                "sku": menu_item.sku,
+                "name": menu_item.name,
+                "price": menu_item.price,
+                "quantity": quantity,
+            }
+        )
+    items = lines
 
-    connection = connect_db()
+    totals = money.compute_totals(
+        ((item["price"], item["quantity"]) for item in items),
+        TAX_RATE,
+        tip=tip,
+        discount=discount,
+    )
+    subtotal, tax, tip, discount, total = totals.amounts()
+
+    order = {
+        "ticket_type": order_type,
+        "table_label": table_label,
+        "delivery_address": delivery_address,
+        "delivery_contact": delivery_contact,
+        "created_at": datetime.utcnow().isoformat(),
+        "subtotal": subtotal,
+        "tax": tax,
+        "tip": tip,
+        "discount": discount,
+        "total": total,
+    }
+    connection = get_db()
     cursor = connection.cursor()
     cursor.execute(
         """
         INSERT INTO orders (
             ticket_type, table_label, delivery_address, delivery_contact, created_at,
             subtotal, tax, tip, discount, total
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ) VALUES (
+            :ticket_type, :table_label, :delivery_address, :delivery_contact,
+            :created_at, :subtotal, :tax, :tip, :discount, :total
+        )
         """,
-        (
-            order_type,
-            table_label,
-            delivery_address,
-            delivery_contact,
-            datetime.utcnow().isoformat(),
-            subtotal,
-            tax,
-            tip,
-            discount,
-            total,
-        ),
+        order,
     )
     order_id = cursor.lastrowid
+    order["id"] = order_id
 
     item_rows = [
         (
@@ -462,7 +934,7 @@ def create_order():
             item["name"],
             item["quantity"],
             item["price"],
-            item["price"] * item["quantity"],
+            money.to_amount(money.line_cents(item["price"], item["quantity"])),
         )
         for item in items
     ]
@@ -474,24 +946,28 @@ def create_order():
         """,
         item_rows,
     )
-    kitchen_print_job_id = queue_kitchen_ticket(connection, order_id)
+    print_job_ids = queue_station_tickets(connection, order, items)
     connection.commit()
-    connection.close()
+    event_bus.publish(
+        "order.created",
+        {
+            "id": order_id,
+            "ticketType": order_type,
+            "tableLabel": table_label,
+            "total": total,
+        },
+    )
 
     return jsonify(
         {
             "orderId": order_id,
             "total": total,
-            "kitchenPrintJobId": kitchen_print_job_id,
+            "kitchenPrintJobId": print_job_ids[0] if print_job_ids else None,
+            "printJobIds": print_job_ids,
         }
     )
 
 
-def _fetch_order_total(cursor, order_id):
-    cursor.execute("SELECT total FROM orders WHERE id = ?", (order_id,))
-    return cursor.fetchone()
-
-
 @app.route("/api/payments", methods=["POST"])
 def create_payment():
     payload = request.get_json(force=True)
@@ -504,22 +980,24 @@ def create_payment():
     if method not in {"cash", "card"}:
         return jsonify({"error": "Payment method is invalid."}), 400
 
-    connection = connect_db()
+    connection = get_db()
     cursor = connection.cursor()
-    order = _fetch_order_total(cursor, order_id)
+    cursor.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
+    order = cursor.fetchone()
     if not order:
-        connection.close()
         return jsonify({"error": "Order not found."}), 404
 
-    amount_due = float(order["total"])
+    amount_due = money.normalize(order["total"])
     if method == "cash":
-        if amount_tendered < amount_due:
-            connection.close()
+        tendered_cents = money.to_cents(amount_tendered)
+        due_cents = money.to_cents(amount_due)
+        if tendered_cents < due_cents:
             return (
                 jsonify({"error": "Cash tendered must cover the amount due."}),
                 400,
             )
-        change_due = round(amount_tendered - amount_due, 2)
+        amount_tendered = money.to_amount(tendered_cents)
+        change_due = money.to_amount(tendered_cents - due_cents)
         status = "received"
         provider = "cash"
         reference = f"CASH-{order_id}-{int(datetime.utcnow().timestamp())}"
@@ -530,23 +1008,28 @@ def create_payment():
         provider = "stripe-terminal"
         reference = f"STR-{order_id}-{int(datetime.utcnow().timestamp())}"
 
+    payment = {
+        "order_id": order_id,
+        "method": method,
+        "amount_due": amount_due,
+        "amount_tendered": amount_tendered,
+        "change_due": change_due,
+        "status": status,
+        "created_at": datetime.utcnow().isoformat(),
+    }
     cursor.execute(
         """
         INSERT INTO payments (
             order_id, method, amount_due, amount_tendered, change_due, status, created_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ) VALUES (
+            :order_id, :method, :amount_due, :amount_tendered, :change_due, :status,
+            :created_at
+        )
         """,
-        (
-            order_id,
-            method,
-            amount_due,
-            amount_tendered,
-            change_due,
-            status,
-            datetime.utcnow().isoformat(),
-        ),
+        payment,
     )
     payment_id = cursor.lastrowid
+    payment["id"] = payment_id
     cursor.execute(
         """
         INSERT INTO transactions (
@@ -561,9 +1044,12 @@ def create_payment():
             datetime.utcnow().isoformat(),
         ),
     )
-    receipt_print_job_id = queue_receipt(connection, order_id, payment_id)
+    receipt_print_job_id = queue_receipt(connection, dict(order), payment)
     connection.commit()
-    connection.close()
+    event_bus.publish(
+        "order.paid",
+        {"id": order_id, "paymentId": payment_id, "method": method, "total": amount_due},
+    )
 
     return jsonify(
         {
@@ -582,22 +1068,20 @@ def create_payment():
 
 @app.route("/api/orders/<int:order_id>")
 def get_order(order_id):
-    connection = connect_db()
+    connection = get_db()
     cursor = connection.cursor()
     cursor.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
     order = cursor.fetchone()
     if not order:
-        connection.close()
         return jsonify({"error": "Order not found."}), 404
     cursor.execute("SELECT * FROM order_items WHERE order_id = ?", (order_id,))
     items = [dict(row) for row in cursor.fetchall()]
-    connection.close()
     return jsonify({"order": dict(order), "items": items})
 
 
 @app.route("/api/printers", methods=["GET", "POST"])
 def printers():
-    connection = connect_db()
+    connection = get_db()
     cursor = connection.cursor()
     if request.method == "POST":
         payload = request.get_json(force=True)
@@ -610,6 +1094,11 @@ def printers():
             return jsonify({"error": "Connection type is invalid."}), 400
         if not device_identifier:
             return jsonify({"error": "Device identifier is required."}), 400
+        if connection_type == "escpos":
+            try:
+                parse_printer_address(device_identifier)
+            except ValueError:
+                return jsonify({"error": "Device identifier must be host or host:port."}), 400
         cursor.execute(
             """
             INSERT INTO printers (name, connection_type, device_identifier, created_at)
@@ -624,18 +1113,17 @@ def printers():
         )
         printer_id = cursor.lastrowid
         connection.commit()
-        connection.close()
+        invalidate_printer_config()
         return jsonify({"id": printer_id}), 201
 
     cursor.execute("SELECT * FROM printers ORDER BY name")
     printers = [dict(row) for row in cursor.fetchall()]
-    connection.close()
     return jsonify({"printers": printers})
 
 
 @app.route("/api/printers/<int:printer_id>", methods=["DELETE"])
 def delete_printer(printer_id):
-    connection = connect_db()
+    connection = get_db()
     cursor = connection.cursor()
     cursor.execute(
         """
@@ -646,15 +1134,16 @@ def delete_printer(printer_id):
         """,
         (printer_id, printer_id),
     )
+    cursor.execute("DELETE FROM print_routes WHERE printer_id = ?", (printer_id,))
     cursor.execute("DELETE FROM printers WHERE id = ?", (printer_id,))
     connection.commit()
-    connection.close()
+    invalidate_printer_config()
     return jsonify({"deleted": printer_id})
 
 
 @app.route("/api/printer-mappings", methods=["GET", "PUT"])
 def printer_mappings():
-    connection = connect_db()
+    connection = get_db()
     cursor = connection.cursor()
     if request.method == "PUT":
         payload = request.get_json(force=True)
@@ -662,18 +1151,22 @@ def printer_mappings():
         receipt_printer_id = payload.get("receiptPrinterId")
         if kitchen_printer_id:
             cursor.execute(
-                "SELECT 1 FROM printers WHERE id = ?", (kitchen_printer_id,)
+                "SELECT * FROM printers WHERE id = ?", (kitchen_printer_id,)
             )
-            if not cursor.fetchone():
-                connection.close()
+            printer = cursor.fetchone()
+            if not printer:
                 return jsonify({"error": "Kitchen printer not found."}), 400
+            if not is_dispatched(printer):
+                return jsonify({"error": DISPATCHED_PRINTER_REQUIRED}), 400
         if receipt_printer_id:
             cursor.execute(
-                "SELECT 1 FROM printers WHERE id = ?", (receipt_printer_id,)
+                "SELECT * FROM printers WHERE id = ?", (receipt_printer_id,)
             )
-            if not cursor.fetchone():
-                connection.close()
+            printer = cursor.fetchone()
+            if not printer:
                 return jsonify({"error": "Receipt printer not found."}), 400
+            if not is_dispatched(printer):
+                return jsonify({"error": DISPATCHED_PRINTER_REQUIRED}), 400
         cursor.execute(
             """
             UPDATE printer_mappings
@@ -684,31 +1177,99 @@ def printer_mappings():
         )
         mapping = fetch_printer_mapping(cursor)
         connection.commit()
-        connection.close()
+        invalidate_printer_config()
         return jsonify({"updated": True, "mapping": mapping})
 
     mapping = fetch_printer_mapping(cursor)
-    connection.close()
     return jsonify({"mapping": mapping})
 
 
+@app.route("/api/print-routes", methods=["GET", "PUT"])
+def print_routes():
+    connection = get_db()
+    cursor = connection.cursor()
+    if request.method == "PUT":
+        payload = request.get_json(force=True)
+        routes = payload.get("routes", [])
+        rows = []
+        seen = set()
+        for route in routes:
+            match_type = route.get("matchType")
+            match_value = (route.get("matchValue") or "").strip()
+            station = (route.get("station") or "").strip().lower()
+            printer_id = route.get("printerId")
+            if match_type not in PRINT_ROUTE_MATCH_TYPES:
+                return jsonify({"error": "Route match type is invalid."}), 400
+            if not match_value or not station:
+                return jsonify({"error": "Route match value and station are required."}), 400
+            if station == "receipt":
+                return jsonify({"error": "Station name is reserved."}), 400
+            if (match_type, match_value) in seen:
+                return jsonify({"error": f"Duplicate route for {match_value}."}), 400
+            cursor.execute("SELECT * FROM printers WHERE id = ?", (printer_id,))
+            printer = cursor.fetchone()
+            if not printer:
+                return jsonify({"error": "Route printer not found."}), 400
+            if not is_dispatched(printer):
+                return jsonify({"error": DISPATCHED_PRINTER_REQUIRED}), 400
+            seen.add((match_type, match_value))
+            rows.append(
+                (
+                    match_type,
+                    match_value,
+                    station,
+                    printer_id,
+                    datetime.utcnow().isoformat(),
+                )
+            )
+        cursor.execute("DELETE FROM print_routes")
+        cursor.executemany(
+            """
+            INSERT INTO print_routes (
+                match_type, match_value, station, printer_id, created_at
+            ) VALUES (?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        routes = fetch_print_routes(cursor)
+        connection.commit()
+        invalidate_printer_config()
+        return jsonify({"updated": True, "routes": routes})
+
+    return jsonify({"routes": fetch_print_routes(cursor)})
+
+
 @app.route("/api/print-jobs")
 def print_jobs():
-    connection = connect_db()
+    connection = get_db()
     cursor = connection.cursor()
     cursor.execute(
         """
-        SELECT print_jobs.*, printers.name AS printer_name
+        SELECT
+            print_jobs.id, print_jobs.order_id, print_jobs.payment_id,
+            print_jobs.printer_id, print_jobs.job_type, print_jobs.status,
+            print_jobs.created_at, print_jobs.attempts, print_jobs.last_error,
+            print_jobs.completed_at, length(print_jobs.payload) AS payload_size,
+            printers.name AS printer_name
         FROM print_jobs
         JOIN printers ON printers.id = print_jobs.printer_id
-        ORDER BY print_jobs.created_at DESC
+        ORDER BY print_jobs.id DESC
         LIMIT 20
         """
     )
     jobs = [dict(row) for row in cursor.fetchall()]
-    connection.close()
     return jsonify({"jobs": jobs})
 
 
+@app.route("/api/events")
+def stream_events():
+    start_print_job_watcher()
+    return app.response_class(
+        event_bus.stream(request.headers.get("Last-Event-ID"), EVENT_HEARTBEAT_SECONDS),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
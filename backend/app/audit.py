@@ -0,0 +1,197 @@
+"""
+Batched audit-log writer.
+
+In "async" mode create_audit_log hands rows to AuditWriter instead of
+committing them itself; a background thread bulk-inserts them in batches.
+Rows wait on the caller's session until it commits, so a request whose
+transaction rolls back leaves no audit entry.
+"""
+from datetime import datetime
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import SessionLocal
+from . import models
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_PENDING = "pending_audit_rows"
+
+class AuditWriter:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = 200,
+        flush_interval: float = 0.25,
+        max_queue: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "overflow_writes": 0,
+            "batches": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the background thread and write everything still queued."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        self.flush()
+
+    def enqueue(self, row: dict):
+        if not self.running:
+            self.start()
+        try:
+            # Never block: callers are async routes running on the event loop
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # The writer has fallen behind; write this row inline rather
+            # than stall every request or lose the record
+            with self._lock:
+                self._stats["overflow_writes"] += 1
+            self._write([row])
+            return
+        with self._lock:
+            self._stats["enqueued"] += 1
+
+    def flush(self):
+        """Synchronously drain the queue in the calling thread."""
+        batch = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is _STOP:
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats["batches"]
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / batches if batches else 0.0
+        stats["queue_depth"] = self._queue.qsize()
+        stats["running"] = self.running
+        return stats
+
+    def _run(self):
+        while True:
+            try:
+                row = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if row is _STOP:
+                return
+            batch = [row]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                batch.append(row)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list):
+        started = time.perf_counter()
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                db.execute(models.AuditLog.__table__.insert(), batch)
+                db.commit()
+                ok = True
+            except Exception:
+                db.rollback()
+                logger.exception("Failed to write %d audit log rows", len(batch))
+                ok = False
+            finally:
+                db.close()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["written" if ok else "failed"] += len(batch)
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+
+def build_row(
+    actor,
+    action: str,
+    entity_type: str,
+    entity_id: Optional[str] = None,
+    metadata: dict = None
+) -> dict:
+    return {
+        "id": models.generate_uuid(),
+        "actor_id": actor.id if actor else None,
+        "actor_name": actor.full_name if actor else "System",
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "metadata": metadata or {},
+        "created_at": datetime.utcnow(),
+    }
+
+writer = AuditWriter(
+    batch_size=settings.audit_batch_size,
+    flush_interval=settings.audit_flush_interval_ms / 1000,
+)
+
+def defer(db: Session, row: dict):
+    """Queue row for the writer once db commits; drop it if db rolls back."""
+    db.info.setdefault(_PENDING, []).append(row)
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed(session: Session):
+    for row in session.info.pop(_PENDING, ()):
+        writer.enqueue(row)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back(session: Session, previous_transaction):
+    session.info.pop(_PENDING, None)
@@ -1,5 +1,12 @@
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from functools import lru_cache
+import hashlib
+import hmac
+import threading
+import time
+from typing import Any, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
@@ -7,7 +14,7 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from .database import get_db
 from .config import get_settings
-from . import models
+from . import models, audit
 
 settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -53,12 +60,38 @@ ROLE_PERMISSIONS = {
     ],
 }
 
+# Compiled once at import so permission checks are set lookups
+ROLE_PERMISSION_SETS = {
+    role: frozenset(permissions) for role, permissions in ROLE_PERMISSIONS.items()
+}
+
+@lru_cache(maxsize=256)
+def compile_permissions(role: str, permissions: tuple = ()) -> frozenset:
+    """Effective permission set for a role, honouring a per-user override list."""
+    role_permissions = ROLE_PERMISSION_SETS.get(role, frozenset())
+    if not permissions:
+        return role_permissions
+    compiled = frozenset(permissions)
+    # Share the role's set when the stored list is just a copy of it
+    return role_permissions if compiled == role_permissions else compiled
+
 def hash_pin(pin: str) -> str:
     return pwd_context.hash(pin)
 
 def verify_pin(plain_pin: str, hashed_pin: str) -> bool:
     return pwd_context.verify(plain_pin, hashed_pin)
 
+def pin_key_id() -> str:
+    """Short id of the current SECRET_KEY, prefixed to every PIN fingerprint."""
+    return hmac.new(settings.secret_key.encode(), b"pin-fingerprint", hashlib.sha256).hexdigest()[:8]
+
+def pin_fingerprint(pin: str) -> str:
+    # Keyed digest stored next to pin_hash so login can look a user up by
+    # index and only bcrypt-verify the matching row. The key id prefix marks
+    # fingerprints made with an older SECRET_KEY so login can recompute them.
+    digest = hmac.new(settings.secret_key.encode(), pin.encode(), hashlib.sha256).hexdigest()
+    return f"{pin_key_id()}:{digest}"
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
@@ -68,17 +101,98 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 def get_permissions_for_role(role: str) -> list:
     return ROLE_PERMISSIONS.get(role, [])
 
+@dataclass(frozen=True)
+class CurrentUser:
+    """Detached snapshot of the authenticated user, safe to share across requests."""
+    id: str
+    email: str
+    full_name: str
+    role: Any
+    permissions: list
+    is_active: bool
+    created_at: Optional[datetime]
+    permission_set: frozenset = frozenset()
+
+    @classmethod
+    def from_model(cls, user: models.User) -> "CurrentUser":
+        role = getattr(user.role, "value", user.role)
+        permissions = list(user.permissions or [])
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            permissions=permissions,
+            is_active=user.is_active,
+            created_at=user.created_at,
+            permission_set=compile_permissions(role, tuple(permissions)),
+        )
+
+class TokenCache:
+    """Bounded LRU of bearer token -> CurrentUser with a per-entry deadline."""
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            deadline, user = entry
+            if deadline <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: CurrentUser, token_exp: Optional[float] = None):
+        if self.maxsize <= 0 or self.ttl_seconds <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            stale = [token for token, (_, user) in self._entries.items() if user.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(settings.token_cache_size, settings.token_cache_ttl_seconds)
+
+def invalidate_user(user_id: str):
+    token_cache.invalidate_user(user_id)
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> models.User:
+) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token = credentials.credentials
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         user_id: str = payload.get("sub")
         if user_id is None:
@@ -90,11 +204,13 @@ async def get_current_user(
     if user is None or not user.is_active:
         raise credentials_exception
     
-    return user
+    current_user = CurrentUser.from_model(user)
+    token_cache.put(token, current_user, payload.get("exp"))
+    return current_user
 
 def require_permission(permission: str):
-    async def permission_checker(current_user: models.User = Depends(get_current_user)):
-        if permission not in current_user.permissions:
+    async def permission_checker(current_user: CurrentUser = Depends(get_current_user)):
+        if permission not in current_user.permission_set:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Permission denied: {permission} required"
@@ -110,6 +226,17 @@ def create_audit_log(
     entity_id: Optional[str] = None,
     metadata: dict = None
 ):
+    """Record an audit entry; call it before the caller's commit.
+
+    In "transaction" mode the row joins the caller's transaction. In "async"
+    mode it is queued for the batched background writer when that
+    transaction commits, and dropped if it rolls back.
+    """
+    if settings.audit_log_mode == "async":
+        row = audit.build_row(actor, action, entity_type, entity_id, metadata)
+        audit.defer(db, row)
+        return row
+    
     log = models.AuditLog(
         actor_id=actor.id if actor else None,
         actor_name=actor.full_name if actor else "System",
@@ -119,6 +246,5 @@ def create_audit_log(
         metadata=metadata or {}
     )
     db.add(log)
-    db.commit()
     return log
 
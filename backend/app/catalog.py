@@ -0,0 +1,139 @@
+"""
+Process-wide menu snapshot and catalog index.
+
+The serialized /api/menu responses are built once per menu version and
+served with a strong ETag, and order lines are priced from an in-memory
+index of the menu. Menu writes in this process invalidate both
+immediately; other workers rebuild after MENU_CACHE_TTL_SECONDS.
+"""
+from dataclasses import dataclass
+import hashlib
+import json
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from . import models, schemas
+
+settings = get_settings()
+
+class MenuSnapshot:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._responses = {}  # (category, available_only) -> (built_at, etag, body)
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._responses.clear()
+
+    def response(self, db: Session, category: Optional[str], available_only: bool) -> tuple:
+        """Return (etag, body) for a menu listing, building it if stale."""
+        key = (category, available_only)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._responses.get(key)
+            version = self.version
+        if cached and now - cached[0] < self.ttl_seconds:
+            return cached[1], cached[2]
+
+        query = db.query(models.MenuItem)
+        if category:
+            query = query.filter(models.MenuItem.category == category)
+        if available_only:
+            query = query.filter(models.MenuItem.is_available == True)
+        items = query.order_by(models.MenuItem.category, models.MenuItem.name).all()
+        body = json.dumps(
+            [schemas.MenuItemResponse.model_validate(item).model_dump(mode="json") for item in items],
+            separators=(",", ":"),
+        ).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+        # category comes from an unauthenticated query string; caching every
+        # value a client makes up would grow without bound, so only cache
+        # listings of categories that exist
+        if items or not category:
+            with self._lock:
+                # Don't cache a build that raced with a menu write
+                if version == self.version:
+                    self._responses[key] = (now, etag, body)
+        return etag, body
+
+@dataclass(frozen=True)
+class CatalogItem:
+    id: str
+    sku: str
+    name: str
+    name_chinese: Optional[str]
+    price: float
+    category: str
+    tags: tuple
+    is_available: bool
+
+class MenuCatalog:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._by_id = {}
+        self._by_sku = {}
+        self._loaded_at = None
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._loaded_at = None
+
+    def get(self, db: Session, item_id: str) -> Optional[CatalogItem]:
+        self._ensure_loaded(db)
+        return self._by_id.get(item_id)
+
+    def get_by_sku(self, db: Session, sku: str) -> Optional[CatalogItem]:
+        self._ensure_loaded(db)
+        return self._by_sku.get(sku)
+
+    def _ensure_loaded(self, db: Session):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.ttl_seconds:
+            return
+        started = time.monotonic()
+        version = self.version
+        by_id = {}
+        for item in db.query(models.MenuItem).all():
+            by_id[item.id] = CatalogItem(
+                id=item.id,
+                sku=item.sku,
+                name=item.name,
+                name_chinese=item.name_chinese,
+                price=item.price,
+                category=item.category,
+                tags=tuple(item.tags or ()),
+                is_available=bool(item.is_available),
+            )
+        with self._lock:
+            # Swap whole dicts so readers never see a half-built index
+            self._by_id = by_id
+            self._by_sku = {item.sku: item for item in by_id.values()}
+            if version == self.version:
+                self._loaded_at = started
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+menu_snapshot = MenuSnapshot(settings.menu_cache_ttl_seconds)
+menu_catalog = MenuCatalog(settings.menu_cache_ttl_seconds)
+
+def invalidate():
+    """Call after any menu write."""
+    menu_snapshot.invalidate()
+    menu_catalog.invalidate()
@@ -4,10 +4,29 @@ from functools import lru_cache
 class Settings(BaseSettings):
     app_name: str = "Dragon Palace POS"
     database_url: str = "sqlite:///./pos.db"
+    db_profile: str = "production"  # default, production
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size_kib: int = 65536
+    sqlite_mmap_size: int = 268435456  # 256 MiB
     secret_key: str = "your-super-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 720  # 12 hours
+    token_cache_ttl_seconds: int = 60
+    token_cache_size: int = 1024
+    menu_cache_ttl_seconds: int = 30
     tax_rate: float = 0.0825
+    business_day_start_hour: int = 4  # orders before 4am count toward the previous day
+    order_number_start: int = 1001
+    order_number_block_size: int = 20
+    order_number_daily_reset: bool = False
+    audit_log_mode: str = "transaction"  # transaction, async
+    audit_batch_size: int = 200
+    audit_flush_interval_ms: int = 250
+    event_buffer_size: int = 1000
+    event_heartbeat_seconds: int = 15
     
     class Config:
         env_file = ".env"
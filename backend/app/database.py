@@ -1,14 +1,54 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.database_url, 
-    connect_args={"check_same_thread": False}
-)
+def sqlite_pragmas(settings) -> list:
+    """PRAGMAs run on every new SQLite connection for the configured profile."""
+    if settings.db_profile != "production":
+        return []
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA synchronous = {settings.sqlite_synchronous}",
+        f"PRAGMA cache_size = -{settings.sqlite_cache_size_kib}",
+        f"PRAGMA mmap_size = {settings.sqlite_mmap_size}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not is_memory_database(settings.database_url):
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+def is_memory_database(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def engine_options(settings) -> dict:
+    options = {}
+    if settings.database_url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if is_memory_database(settings.database_url):
+            return options
+    if settings.db_profile == "production":
+        options["pool_size"] = settings.db_pool_size
+        options["max_overflow"] = settings.db_max_overflow
+        # An embedded SQLite file has no server connection to go stale, so
+        # the SELECT 1 on every checkout would only add a round trip
+        if not settings.database_url.startswith("sqlite"):
+            options["pool_pre_ping"] = True
+    return options
+
+engine = create_engine(settings.database_url, **engine_options(settings))
+
+if engine.dialect.name == "sqlite":
+    _pragmas = sqlite_pragmas(settings)
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in _pragmas:
+            cursor.execute(pragma)
+        cursor.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,4 +60,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
@@ -0,0 +1,155 @@
+"""
+In-process pub/sub bus behind the /api/events server-sent events stream.
+
+Events are serialized once when published and kept in a bounded ring
+buffer, so a terminal that reconnects with Last-Event-ID gets what it
+missed. One that fell further behind than the buffer gets a `resync`
+event and should refetch. Standard library only, so app.py can use it.
+
+stream() blocks a thread per subscriber, which suits Flask's threaded
+server. astream() waits on the event loop instead: publishers wake each
+subscriber through its own asyncio.Queue with loop.call_soon_threadsafe.
+"""
+import asyncio
+from collections import deque
+import json
+import threading
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+class Event:
+    __slots__ = ("id", "type", "data", "wire")
+
+    def __init__(self, event_id: int, event_type: str, data: dict):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.wire = (
+            f"id: {event_id}\nevent: {event_type}\n"
+            f"data: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+        ).encode()
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+KEEP_ALIVE = b": keep-alive\n\n"
+
+class EventBus:
+    def __init__(self, buffer_size: int = 1000):
+        self._buffer = deque(maxlen=buffer_size)
+        # Ids start at the wall clock in ms so they keep increasing across
+        # restarts and a stale Last-Event-ID is detected as a gap
+        self._last_id = int(time.time() * 1000)
+        self._condition = threading.Condition()
+        self._closed = False
+        # (loop, queue) for each astream() subscriber
+        self._subscribers = set()
+
+    def publish(self, event_type: str, data: dict) -> Event:
+        with self._condition:
+            self._last_id += 1
+            event = Event(self._last_id, event_type, data)
+            self._buffer.append(event)
+            self._notify()
+        return event
+
+    def close(self):
+        """Wake every subscriber and end their streams."""
+        with self._condition:
+            self._closed = True
+            self._notify()
+
+    def _notify(self):
+        self._condition.notify_all()
+        for subscriber in list(self._subscribers):
+            loop, queue = subscriber
+            try:
+                loop.call_soon_threadsafe(_wake, queue)
+            except RuntimeError:
+                # Its event loop has been closed
+                self._subscribers.discard(subscriber)
+
+    def since(self, last_id: int) -> Optional[List[Event]]:
+        """Events after last_id, or None if some were already dropped."""
+        with self._condition:
+            return self._since(last_id)
+
+    def _since(self, last_id: int) -> Optional[List[Event]]:
+        if last_id > self._last_id:
+            return None
+        if not self._buffer:
+            return [] if last_id == self._last_id else None
+        oldest = self._buffer[0].id
+        if last_id < oldest - 1:
+            return None
+        return [event for event in self._buffer if event.id > last_id]
+
+    def _start_cursor(self, last_event_id: Optional[str]) -> tuple:
+        """(cursor, whether to send RESYNC first) for a new subscriber."""
+        if last_event_id:
+            try:
+                return int(last_event_id), False
+            except ValueError:
+                return self._last_id, True
+        return self._last_id, False
+
+    def stream(self, last_event_id: Optional[str] = None, heartbeat: float = 15.0) -> Iterator[bytes]:
+        """Yield SSE frames, resuming after last_event_id when given."""
+        with self._condition:
+            cursor, resync = self._start_cursor(last_event_id)
+        if resync:
+            yield RESYNC
+        while True:
+            with self._condition:
+                events = self._since(cursor)
+                if events == [] and not self._closed:
+                    self._condition.wait(heartbeat)
+                    events = self._since(cursor)
+                if self._closed:
+                    return
+                if events is None:
+                    cursor = self._last_id
+            if events is None:
+                yield RESYNC
+            elif not events:
+                yield KEEP_ALIVE
+            else:
+                for event in events:
+                    yield event.wire
+                cursor = events[-1].id
+
+    async def astream(self, last_event_id: Optional[str] = None, heartbeat: float = 15.0) -> AsyncIterator[bytes]:
+        """Like stream(), but waits on the running event loop, not a thread."""
+        wakeup = asyncio.Queue(maxsize=1)
+        subscriber = (asyncio.get_running_loop(), wakeup)
+        with self._condition:
+            # Subscribe before the first read so no publish is missed
+            self._subscribers.add(subscriber)
+            cursor, resync = self._start_cursor(last_event_id)
+        try:
+            if resync:
+                yield RESYNC
+            while True:
+                with self._condition:
+                    if self._closed:
+                        return
+                    events = self._since(cursor)
+                    if events is None:
+                        cursor = self._last_id
+                if events is None:
+                    yield RESYNC
+                elif events:
+                    for event in events:
+                        yield event.wire
+                    cursor = events[-1].id
+                else:
+                    try:
+                        await asyncio.wait_for(wakeup.get(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield KEEP_ALIVE
+        finally:
+            with self._condition:
+                self._subscribers.discard(subscriber)
+
+def _wake(queue: asyncio.Queue):
+    # Runs on the subscriber's loop; one pending wakeup is enough
+    if queue.empty():
+        queue.put_nowait(None)
@@ -0,0 +1,92 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read with a server-side cursor in batches and written out as
+they arrive, so memory stays flat however large the export is.
+"""
+import csv
+from datetime import date, datetime, timedelta
+import enum
+import io
+import json
+from typing import Iterator, Optional
+
+from sqlalchemy import String, literal, select
+
+from .database import SessionLocal
+from . import models
+
+BATCH_SIZE = 1000
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+AUDIT_LOG_COLUMNS = [
+    models.AuditLog.id, models.AuditLog.created_at, models.AuditLog.actor_id,
+    models.AuditLog.actor_name, models.AuditLog.action, models.AuditLog.entity_type,
+    models.AuditLog.entity_id, models.AuditLog.__table__.c["metadata"],
+]
+
+ORDER_COLUMNS = [
+    models.Order.id, models.Order.order_number, models.Order.type, models.Order.status,
+    models.Order.table_label, models.Order.server_id, models.Order.guest_count,
+    models.Order.subtotal, models.Order.tax, models.Order.tip, models.Order.discount,
+    models.Order.total, models.Order.created_at, models.Order.paid_at,
+]
+
+PAYMENT_COLUMNS = [
+    models.Payment.id, models.Payment.order_id, models.Payment.method, models.Payment.amount,
+    models.Payment.tip, models.Payment.status, models.Payment.reference,
+    models.Payment.cash_tendered, models.Payment.change_due, models.Payment.processed_by,
+    models.Payment.created_at,
+]
+
+def build_query(model, columns: list, from_date: Optional[date], to_date: Optional[date]):
+    stmt = select(*columns)
+    # created_at is stored as text; compare against date strings so the
+    # range check stays an index scan
+    if from_date:
+        stmt = stmt.where(model.created_at >= literal(from_date.isoformat(), String))
+    if to_date:
+        stmt = stmt.where(model.created_at < literal((to_date + timedelta(days=1)).isoformat(), String))
+    return stmt.order_by(model.created_at, model.id)
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _csv_cell(value):
+    value = _plain(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+def stream(stmt, fmt: str) -> Iterator[str]:
+    """Yield the export in chunks of up to BATCH_SIZE rows, using its own session."""
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=BATCH_SIZE))
+        keys = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(keys)
+        for batch in result.partitions():
+            for row in batch:
+                if writer:
+                    writer.writerow([_csv_cell(value) for value in row])
+                else:
+                    buffer.write(json.dumps({key: _plain(value) for key, value in zip(keys, row)}))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
@@ -1,20 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import String, and_, func, literal, or_
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import time
 
-from .database import engine, get_db, Base
+from .database import SessionLocal, engine, get_db, Base
 from .config import get_settings
-from . import models, schemas, auth
+from . import models, schemas, auth, audit, sequences, rollup, exports, catalog, money, events, migrations
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create tables, and add columns and indexes missing from older databases
+migrations.upgrade(engine, Base.metadata)
+# Databases upgraded from before the sales rollup existed start with it empty
+with SessionLocal() as _db:
+    rollup.backfill_if_empty(_db)
 
 settings = get_settings()
 app = FastAPI(title=settings.app_name, version="1.0.0")
+event_bus = events.EventBus(settings.event_buffer_size)
 
 # CORS
 app.add_middleware(
@@ -25,21 +31,109 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Order counter (in production, use database sequence)
-order_counter = {"value": 1000}
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    # Another request updated the same order between our read and our write
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": {"message": "Order was changed on another terminal"}}
+    )
+
+@app.on_event("shutdown")
+def flush_audit_log():
+    audit.writer.stop()
+
+@app.on_event("shutdown")
+def close_event_streams():
+    event_bus.close()
+
+# ============== PAGINATION ==============
+
+def apply_keyset(query, model, before: Optional[str]):
+    """Order newest first and, given a `before=<created_at>,<id>` cursor, skip to it."""
+    if before:
+        created_at, _, row_id = before.partition(",")
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Compare against the stored text form so server-default timestamps
+        # (no fractional seconds) line up with the cursor exactly
+        stored = created_at.strftime("%Y-%m-%d %H:%M:%S.%f" if created_at.microsecond else "%Y-%m-%d %H:%M:%S")
+        cursor_time = literal(stored, String)
+        query = query.filter(or_(
+            model.created_at < cursor_time,
+            and_(model.created_at == cursor_time, model.id < row_id)
+        ))
+    return query.order_by(model.created_at.desc(), model.id.desc())
+
+def set_next_cursor(response: Response, rows: list, limit: int):
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = f"{last.created_at.isoformat()},{last.id}"
+
+# ============== EVENTS ==============
+
+def publish_order(event_type: str, order: models.Order):
+    event_bus.publish(event_type, {
+        "id": order.id,
+        "orderNumber": order.order_number,
+        "status": order.status.value,
+        "tableId": order.table_id,
+        "version": order.version
+    })
+
+def publish_table(table: models.Table):
+    event_bus.publish("table.updated", {
+        "id": table.id,
+        "status": table.status.value,
+        "currentOrderId": table.current_order_id
+    })
+
+@app.get("/api/events")
+async def stream_events(
+    last_event_id: Optional[str] = Header(None),
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:read"))
+):
+    # Subscribers wait on the event loop, so idle terminals hold no threads
+    return StreamingResponse(
+        event_bus.astream(last_event_id, settings.event_heartbeat_seconds),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ============== AUTH ==============
 
 @app.post("/api/auth/login", response_model=schemas.TokenResponse)
 async def login(request: schemas.LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.is_active == True).all()
+    fingerprint = auth.pin_fingerprint(request.pin)
+    candidates = db.query(models.User).filter(
+        models.User.is_active == True,
+        models.User.pin_fingerprint == fingerprint
+    ).all()
     authenticated_user = None
     
-    for u in user:
+    for u in candidates:
         if auth.verify_pin(request.pin, u.pin_hash):
             authenticated_user = u
             break
     
+    if not authenticated_user:
+        # Users created before fingerprints existed, or fingerprinted with a
+        # previous SECRET_KEY; recompute on their first login
+        legacy_users = db.query(models.User).filter(
+            models.User.is_active == True,
+            or_(
+                models.User.pin_fingerprint == None,
+                ~models.User.pin_fingerprint.startswith(f"{auth.pin_key_id()}:")
+            )
+        ).all()
+        for u in legacy_users:
+            if auth.verify_pin(request.pin, u.pin_hash):
+                u.pin_fingerprint = fingerprint
+                authenticated_user = u
+                break
+    
     if not authenticated_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,6 +142,7 @@ async def login(request: schemas.LoginRequest, db: Session = Depends(get_db)):
     
     access_token = auth.create_access_token(data={"sub": authenticated_user.id})
     auth.create_audit_log(db, authenticated_user, "login", "session", authenticated_user.id)
+    db.commit()
     
     return {
         "access_token": access_token,
@@ -57,14 +152,15 @@ async def login(request: schemas.LoginRequest, db: Session = Depends(get_db)):
 
 @app.post("/api/auth/logout")
 async def logout(
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     auth.create_audit_log(db, current_user, "logout", "session", current_user.id)
+    db.commit()
     return {"message": "Logged out successfully"}
 
 @app.get("/api/auth/me", response_model=schemas.UserResponse)
-async def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
+async def get_current_user_info(current_user: auth.CurrentUser = Depends(auth.get_current_user)):
     return current_user
 
 # ============== USERS ==============
@@ -72,7 +168,7 @@ async def get_current_user_info(current_user: models.User = Depends(auth.get_cur
 @app.get("/api/users", response_model=List[schemas.UserResponse])
 async def list_users(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("users:read"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("users:read"))
 ):
     return db.query(models.User).all()
 
@@ -80,25 +176,31 @@ async def list_users(
 async def create_user(
     user_data: schemas.UserCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("users:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("users:write"))
 ):
     # Check if email exists
     existing = db.query(models.User).filter(models.User.email == user_data.email).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    fingerprint = auth.pin_fingerprint(user_data.pin)
+    if db.query(models.User).filter(models.User.pin_fingerprint == fingerprint).first():
+        raise HTTPException(status_code=400, detail="PIN already in use")
+    
     user = models.User(
         email=user_data.email,
         full_name=user_data.full_name,
         pin_hash=auth.hash_pin(user_data.pin),
+        pin_fingerprint=fingerprint,
         role=user_data.role,
         permissions=auth.get_permissions_for_role(user_data.role.value)
     )
     db.add(user)
+    db.flush()
+    auth.create_audit_log(db, current_user, "create", "user", user.id, {"email": user.email})
     db.commit()
     db.refresh(user)
     
-    auth.create_audit_log(db, current_user, "create", "user", user.id, {"email": user.email})
     return user
 
 @app.put("/api/users/{user_id}", response_model=schemas.UserResponse)
@@ -106,7 +208,7 @@ async def update_user(
     user_id: str,
     user_data: schemas.UserUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("users:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("users:write"))
 ):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
@@ -114,24 +216,33 @@ async def update_user(
     
     update_data = user_data.model_dump(exclude_unset=True)
     if "pin" in update_data:
-        update_data["pin_hash"] = auth.hash_pin(update_data.pop("pin"))
+        pin = update_data.pop("pin")
+        fingerprint = auth.pin_fingerprint(pin)
+        if db.query(models.User).filter(
+            models.User.pin_fingerprint == fingerprint,
+            models.User.id != user_id
+        ).first():
+            raise HTTPException(status_code=400, detail="PIN already in use")
+        update_data["pin_hash"] = auth.hash_pin(pin)
+        update_data["pin_fingerprint"] = fingerprint
     if "role" in update_data:
         update_data["permissions"] = auth.get_permissions_for_role(update_data["role"].value)
     
     for key, value in update_data.items():
         setattr(user, key, value)
     
+    auth.create_audit_log(db, current_user, "update", "user", user.id)
     db.commit()
     db.refresh(user)
+    auth.invalidate_user(user.id)
     
-    auth.create_audit_log(db, current_user, "update", "user", user.id)
     return user
 
 @app.delete("/api/users/{user_id}")
 async def deactivate_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("users:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("users:write"))
 ):
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot deactivate yourself")
@@ -141,9 +252,10 @@ async def deactivate_user(
         raise HTTPException(status_code=404, detail="User not found")
     
     user.is_active = False
+    auth.create_audit_log(db, current_user, "delete", "user", user_id)
     db.commit()
+    auth.invalidate_user(user_id)
     
-    auth.create_audit_log(db, current_user, "delete", "user", user_id)
     return {"message": "User deactivated"}
 
 # ============== MENU ==============
@@ -152,27 +264,29 @@ async def deactivate_user(
 async def list_menu_items(
     category: Optional[str] = None,
     available_only: bool = True,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.MenuItem)
-    if category:
-        query = query.filter(models.MenuItem.category == category)
-    if available_only:
-        query = query.filter(models.MenuItem.is_available == True)
-    return query.order_by(models.MenuItem.category, models.MenuItem.name).all()
+    etag, body = catalog.menu_snapshot.response(db, category, available_only)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if catalog.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/api/menu", response_model=schemas.MenuItemResponse)
 async def create_menu_item(
     item_data: schemas.MenuItemCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("menu:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("menu:write"))
 ):
     item = models.MenuItem(**item_data.model_dump())
     db.add(item)
+    db.flush()
+    auth.create_audit_log(db, current_user, "create", "menu_item", item.id, {"name": item.name})
     db.commit()
     db.refresh(item)
+    catalog.invalidate()
     
-    auth.create_audit_log(db, current_user, "create", "menu_item", item.id, {"name": item.name})
     return item
 
 @app.put("/api/menu/{item_id}", response_model=schemas.MenuItemResponse)
@@ -180,7 +294,7 @@ async def update_menu_item(
     item_id: str,
     item_data: schemas.MenuItemUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("menu:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("menu:write"))
 ):
     item = db.query(models.MenuItem).filter(models.MenuItem.id == item_id).first()
     if not item:
@@ -189,10 +303,11 @@ async def update_menu_item(
     for key, value in item_data.model_dump(exclude_unset=True).items():
         setattr(item, key, value)
     
+    auth.create_audit_log(db, current_user, "update", "menu_item", item.id)
     db.commit()
     db.refresh(item)
+    catalog.invalidate()
     
-    auth.create_audit_log(db, current_user, "update", "menu_item", item.id)
     return item
 
 # ============== TABLES ==============
@@ -205,7 +320,7 @@ async def list_tables(db: Session = Depends(get_db)):
 async def create_table(
     table_data: schemas.TableCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("tables:layout"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("tables:layout"))
 ):
     table = models.Table(**table_data.model_dump())
     db.add(table)
@@ -218,7 +333,7 @@ async def update_table(
     table_id: str,
     table_data: schemas.TableUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("tables:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("tables:write"))
 ):
     table = db.query(models.Table).filter(models.Table.id == table_id).first()
     if not table:
@@ -228,20 +343,21 @@ async def update_table(
     for key, value in table_data.model_dump(exclude_unset=True).items():
         setattr(table, key, value)
     
-    db.commit()
-    db.refresh(table)
-    
     if old_status != table.status:
         action = "table_clear" if table.status == models.TableStatus.available else "table_assign"
         auth.create_audit_log(db, current_user, action, "table", table.id, {"status": table.status.value})
     
+    db.commit()
+    db.refresh(table)
+    
+    publish_table(table)
     return table
 
 @app.delete("/api/tables/{table_id}")
 async def delete_table(
     table_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("tables:layout"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("tables:layout"))
 ):
     table = db.query(models.Table).filter(models.Table.id == table_id).first()
     if not table:
@@ -253,21 +369,65 @@ async def delete_table(
 
 # ============== ORDERS ==============
 
+def check_order_version(order: models.Order, if_match: Optional[str]):
+    """Reject an edit made against an older version of the order.
+    
+    Terminals send the version they last saw in If-Match; on 409 they should
+    reload the order and reapply their change.
+    """
+    if if_match is not None and if_match.strip().removeprefix("W/").strip('"') != str(order.version):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Order was changed on another terminal", "version": order.version}
+        )
+
+# Only /payments and /void keep the sales rollup in step with these
+CLOSED_ORDER_STATUSES = (models.OrderStatus.paid, models.OrderStatus.voided)
+# Fields of a closed order that PUT /api/orders/{id} may not change
+SETTLED_ORDER_FIELDS = {"status", "tip", "discount"}
+
+def check_order_open(order: models.Order):
+    """Reject edits to the lines, status or totals of a paid or voided order."""
+    if order.status in CLOSED_ORDER_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Order is {order.status.value}; change it through /api/payments or /void"
+        )
+
+def recalculate_totals(order: models.Order):
+    """Recompute subtotal, tax and total from the order's lines in whole cents."""
+    totals = money.compute_totals(
+        ((item.price, item.quantity) for item in order.items),
+        settings.tax_rate,
+        tip=order.tip,
+        discount=order.discount
+    )
+    order.subtotal, order.tax, order.tip, order.discount, order.total = totals.amounts()
+    # Always write the order row so the version check covers line-only edits
+    order.updated_at = datetime.utcnow()
+
 @app.get("/api/orders", response_model=List[schemas.OrderResponse])
 async def list_orders(
+    response: Response,
     status: Optional[str] = None,
     type: Optional[str] = None,
+    before: Optional[str] = None,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:read"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:read"))
 ):
-    query = db.query(models.Order)
+    # One query for orders + servers, one for all their items
+    query = db.query(models.Order).options(
+        joinedload(models.Order.server),
+        selectinload(models.Order.items)
+    )
     if status:
         query = query.filter(models.Order.status == status)
     if type:
         query = query.filter(models.Order.type == type)
     
-    orders = query.order_by(models.Order.created_at.desc()).limit(limit).all()
+    orders = apply_keyset(query, models.Order, before).limit(limit).all()
+    set_next_cursor(response, orders, limit)
     
     # Add server name to response
     for order in orders:
@@ -280,10 +440,8 @@ async def list_orders(
 async def create_order(
     order_data: schemas.OrderCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
 ):
-    order_counter["value"] += 1
-    
     table = None
     if order_data.table_id:
         table = db.query(models.Table).filter(models.Table.id == order_data.table_id).first()
@@ -291,7 +449,7 @@ async def create_order(
             table.status = models.TableStatus.occupied
     
     order = models.Order(
-        order_number=order_counter["value"],
+        order_number=sequences.next_order_number(),
         type=order_data.type,
         table_id=order_data.table_id,
         table_label=table.label if table else None,
@@ -309,6 +467,10 @@ async def create_order(
     db.commit()
     db.refresh(order)
     
+    publish_order("order.created", order)
+    if table:
+        publish_table(table)
+    
     order.server_name = current_user.full_name
     return order
 
@@ -316,9 +478,12 @@ async def create_order(
 async def get_order(
     order_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:read"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:read"))
 ):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    order = db.query(models.Order).options(
+        joinedload(models.Order.server),
+        selectinload(models.Order.items)
+    ).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -331,42 +496,54 @@ async def get_order(
 async def update_order(
     order_id: str,
     order_data: schemas.OrderUpdate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
 ):
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    check_order_version(order, if_match)
+    
+    changes = order_data.model_dump(exclude_unset=True)
+    if changes.get("status") in CLOSED_ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Pay through /api/payments and void through /void")
+    if changes.keys() & SETTLED_ORDER_FIELDS:
+        check_order_open(order)
     
-    for key, value in order_data.model_dump(exclude_unset=True).items():
+    for key, value in changes.items():
         setattr(order, key, value)
     
     # Recalculate total if tip or discount changed
-    order.total = order.subtotal + order.tax + order.tip - order.discount
+    recalculate_totals(order)
     
+    auth.create_audit_log(db, current_user, "order_modify", "order", order.id)
     db.commit()
     db.refresh(order)
     
-    auth.create_audit_log(db, current_user, "order_modify", "order", order.id)
     return order
 
 @app.post("/api/orders/{order_id}/items", response_model=schemas.OrderItemResponse)
 async def add_order_item(
     order_id: str,
     item_data: schemas.OrderItemCreate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
 ):
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    check_order_version(order, if_match)
+    check_order_open(order)
     
-    menu_item = db.query(models.MenuItem).filter(models.MenuItem.id == item_data.menu_item_id).first()
+    menu_item = catalog.menu_catalog.get(db, item_data.menu_item_id)
     if not menu_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    if not menu_item.is_available:
+        raise HTTPException(status_code=400, detail=f"{menu_item.name} is not available")
     
     order_item = models.OrderItem(
-        order_id=order_id,
         menu_item_id=menu_item.id,
         name=menu_item.name,
         name_chinese=menu_item.name_chinese,
@@ -374,31 +551,106 @@ async def add_order_item(
         price=menu_item.price,
         notes=item_data.notes
     )
-    db.add(order_item)
+    order.items.append(order_item)
     
     # Recalculate totals
-    order.subtotal += menu_item.price * item_data.quantity
-    order.tax = order.subtotal * settings.tax_rate
-    order.total = order.subtotal + order.tax + order.tip - order.discount
-    
-    db.commit()
-    db.refresh(order_item)
+    recalculate_totals(order)
     
+    db.flush()
     auth.create_audit_log(db, current_user, "item_add", "order_item", order_item.id, {
         "orderId": order_id,
         "name": menu_item.name,
         "quantity": item_data.quantity
     })
     
+    db.commit()
+    db.refresh(order_item)
+    
     return order_item
 
+@app.post("/api/orders/{order_id}/items/batch", response_model=schemas.OrderResponse)
+async def batch_order_items(
+    order_id: str,
+    batch: schemas.OrderItemBatch,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
+):
+    order = db.query(models.Order).options(
+        joinedload(models.Order.server),
+        selectinload(models.Order.items)
+    ).filter(models.Order.id == order_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    check_order_version(order, if_match)
+    check_order_open(order)
+    
+    # Validate everything before touching the order so a bad line changes nothing
+    items_by_id = {item.id: item for item in order.items}
+    update_ids = [change.id for change in batch.update]
+    for ids, field in ((batch.remove, "remove"), (update_ids, "update")):
+        if len(set(ids)) != len(ids):
+            raise HTTPException(status_code=400, detail=f"Duplicate order item ids in {field}")
+    if set(batch.remove) & set(update_ids):
+        raise HTTPException(status_code=400, detail="An order item cannot be both updated and removed")
+    for item_id in batch.remove + update_ids:
+        if item_id not in items_by_id:
+            raise HTTPException(status_code=404, detail=f"Order item {item_id} not found")
+    for change in batch.update:
+        if change.quantity is not None and change.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    menu_items = []
+    for line in batch.add:
+        menu_item = catalog.menu_catalog.get(db, line.menu_item_id)
+        if not menu_item:
+            raise HTTPException(status_code=404, detail=f"Menu item {line.menu_item_id} not found")
+        if not menu_item.is_available:
+            raise HTTPException(status_code=400, detail=f"{menu_item.name} is not available")
+        menu_items.append(menu_item)
+    
+    for item_id in batch.remove:
+        order.items.remove(items_by_id[item_id])
+    for change in batch.update:
+        for key, value in change.model_dump(exclude_unset=True, exclude={"id"}).items():
+            # An explicit null quantity leaves it unchanged; notes can be cleared
+            if key == "quantity" and value is None:
+                continue
+            setattr(items_by_id[change.id], key, value)
+    for line, menu_item in zip(batch.add, menu_items):
+        order.items.append(models.OrderItem(
+            menu_item_id=menu_item.id,
+            name=menu_item.name,
+            name_chinese=menu_item.name_chinese,
+            quantity=line.quantity,
+            price=menu_item.price,
+            notes=line.notes
+        ))
+    
+    # Recalculate totals once for the whole batch
+    recalculate_totals(order)
+    
+    db.flush()
+    auth.create_audit_log(db, current_user, "items_batch", "order", order_id, {
+        "added": [{"name": m.name, "quantity": line.quantity} for line, m in zip(batch.add, menu_items)],
+        "updated": update_ids,
+        "removed": batch.remove
+    })
+    
+    db.commit()
+    db.refresh(order)
+    
+    if order.server:
+        order.server_name = order.server.full_name
+    return order
+
 @app.put("/api/orders/{order_id}/items/{item_id}", response_model=schemas.OrderItemResponse)
 async def update_order_item(
     order_id: str,
     item_id: str,
     item_data: schemas.OrderItemUpdate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
 ):
     order_item = db.query(models.OrderItem).filter(
         models.OrderItem.id == item_id,
@@ -409,30 +661,28 @@ async def update_order_item(
         raise HTTPException(status_code=404, detail="Order item not found")
     
     order = order_item.order
-    old_total = order_item.price * order_item.quantity
+    check_order_version(order, if_match)
+    check_order_open(order)
     
     for key, value in item_data.model_dump(exclude_unset=True).items():
         setattr(order_item, key, value)
     
-    new_total = order_item.price * order_item.quantity
-    
     # Recalculate totals
-    order.subtotal = order.subtotal - old_total + new_total
-    order.tax = order.subtotal * settings.tax_rate
-    order.total = order.subtotal + order.tax + order.tip - order.discount
+    recalculate_totals(order)
     
+    auth.create_audit_log(db, current_user, "item_modify", "order_item", item_id, {"orderId": order_id})
     db.commit()
     db.refresh(order_item)
     
-    auth.create_audit_log(db, current_user, "item_modify", "order_item", item_id, {"orderId": order_id})
     return order_item
 
 @app.delete("/api/orders/{order_id}/items/{item_id}")
 async def remove_order_item(
     order_id: str,
     item_id: str,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
 ):
     order_item = db.query(models.OrderItem).filter(
         models.OrderItem.id == item_id,
@@ -443,18 +693,15 @@ async def remove_order_item(
         raise HTTPException(status_code=404, detail="Order item not found")
     
     order = order_item.order
-    item_total = order_item.price * order_item.quantity
+    check_order_version(order, if_match)
+    check_order_open(order)
     item_name = order_item.name
     item_qty = order_item.quantity
     
-    db.delete(order_item)
+    order.items.remove(order_item)
     
     # Recalculate totals
-    order.subtotal -= item_total
-    order.tax = order.subtotal * settings.tax_rate
-    order.total = order.subtotal + order.tax + order.tip - order.discount
-    
-    db.commit()
+    recalculate_totals(order)
     
     auth.create_audit_log(db, current_user, "item_remove", "order_item", item_id, {
         "orderId": order_id,
@@ -462,17 +709,22 @@ async def remove_order_item(
         "quantity": item_qty
     })
     
+    db.commit()
+    
     return {"message": "Item removed"}
 
 @app.post("/api/orders/{order_id}/send")
 async def send_order_to_kitchen(
     order_id: str,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:write"))
 ):
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    check_order_version(order, if_match)
+    check_order_open(order)
     
     pending_items = [item for item in order.items if item.status == "pending"]
     now = datetime.utcnow()
@@ -482,41 +734,50 @@ async def send_order_to_kitchen(
         item.sent_at = now
     
     order.status = models.OrderStatus.sent
-    db.commit()
-    
     auth.create_audit_log(db, current_user, "order_send", "order", order_id, {
         "itemCount": len(pending_items)
     })
     
+    db.commit()
+    
+    publish_order("order.sent", order)
     return {"message": f"Sent {len(pending_items)} items to kitchen"}
 
 @app.post("/api/orders/{order_id}/void")
 async def void_order(
     order_id: str,
     reason: str,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("orders:void"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("orders:void"))
 ):
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    check_order_version(order, if_match)
     
+    was_paid = order.status == models.OrderStatus.paid
     order.status = models.OrderStatus.voided
+    rollup.record_void(db, order, was_paid)
     
     # Clear table if assigned
+    table = None
     if order.table_id:
         table = db.query(models.Table).filter(models.Table.id == order.table_id).first()
         if table:
             table.status = models.TableStatus.available
             table.current_order_id = None
     
-    db.commit()
-    
     auth.create_audit_log(db, current_user, "order_void", "order", order_id, {
         "reason": reason,
         "total": order.total
     })
     
+    db.commit()
+    
+    publish_order("order.voided", order)
+    if table:
+        publish_table(table)
     return {"message": "Order voided"}
 
 # ============== PAYMENTS ==============
@@ -524,48 +785,55 @@ async def void_order(
 @app.post("/api/payments", response_model=schemas.PaymentResponse)
 async def process_payment(
     payment_data: schemas.PaymentCreate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("payments:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("payments:write"))
 ):
     order = db.query(models.Order).filter(models.Order.id == payment_data.order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    check_order_version(order, if_match)
     
     change_due = None
     if payment_data.method == schemas.PaymentMethod.cash and payment_data.cash_tendered:
-        if payment_data.cash_tendered < payment_data.amount:
+        tendered_cents = money.to_cents(payment_data.cash_tendered)
+        amount_cents = money.to_cents(payment_data.amount)
+        if tendered_cents < amount_cents:
             raise HTTPException(status_code=400, detail="Cash tendered is less than amount due")
-        change_due = payment_data.cash_tendered - payment_data.amount
+        change_due = money.to_amount(tendered_cents - amount_cents)
     
     payment = models.Payment(
         order_id=order.id,
         method=payment_data.method,
-        amount=payment_data.amount,
-        tip=payment_data.tip,
+        amount=money.normalize(payment_data.amount),
+        tip=money.normalize(payment_data.tip),
         status=models.PaymentStatus.approved,
         reference=f"PAY-{int(time.time())}",
-        cash_tendered=payment_data.cash_tendered,
+        cash_tendered=money.normalize(payment_data.cash_tendered),
         change_due=change_due,
         processed_by=current_user.full_name
     )
     db.add(payment)
     
     # Update order
+    was_paid = order.status == models.OrderStatus.paid
+    previous_total, previous_tip = order.total, order.tip
     order.tip = payment_data.tip
-    order.total = order.subtotal + order.tax + order.tip - order.discount
+    recalculate_totals(order)
     order.status = models.OrderStatus.paid
-    order.paid_at = datetime.utcnow()
+    if not was_paid:
+        order.paid_at = datetime.utcnow()
     
     # Clear table
+    table = None
     if order.table_id:
         table = db.query(models.Table).filter(models.Table.id == order.table_id).first()
         if table:
             table.status = models.TableStatus.cleaning
             table.current_order_id = None
     
-    db.commit()
-    db.refresh(payment)
-    
+    db.flush()
+    rollup.record_payment(db, order, payment, was_paid, previous_total, previous_tip)
     auth.create_audit_log(db, current_user, "payment_process", "payment", payment.id, {
         "orderId": order.id,
         "method": payment_data.method.value,
@@ -573,17 +841,25 @@ async def process_payment(
         "tip": payment_data.tip
     })
     
+    db.commit()
+    db.refresh(payment)
+    
+    publish_order("order.paid", order)
+    if table:
+        publish_table(table)
     return payment
 
 # ============== AUDIT LOGS ==============
 
 @app.get("/api/audit-logs", response_model=List[schemas.AuditLogResponse])
 async def list_audit_logs(
+    response: Response,
     action: Optional[str] = None,
     actor_id: Optional[str] = None,
+    before: Optional[str] = None,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("audit:read"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("audit:read"))
 ):
     query = db.query(models.AuditLog)
     if action:
@@ -591,7 +867,15 @@ async def list_audit_logs(
     if actor_id:
         query = query.filter(models.AuditLog.actor_id == actor_id)
     
-    return query.order_by(models.AuditLog.created_at.desc()).limit(limit).all()
+    logs = apply_keyset(query, models.AuditLog, before).limit(limit).all()
+    set_next_cursor(response, logs, limit)
+    return logs
+
+@app.get("/api/audit-logs/metrics")
+async def audit_log_metrics(
+    current_user: auth.CurrentUser = Depends(auth.require_permission("audit:read"))
+):
+    return {"mode": settings.audit_log_mode, **audit.writer.metrics()}
 
 # ============== ANALYTICS ==============
 
@@ -599,50 +883,78 @@ async def list_audit_logs(
 async def get_daily_analytics(
     days: int = 7,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("reports:read"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("reports:read"))
 ):
-    from datetime import date, timedelta
+    today = sequences.business_date()
+    first_day = (today - timedelta(days=days - 1)).isoformat()
+    
+    rows = db.query(models.DailySalesRollup).filter(
+        models.DailySalesRollup.business_date >= first_day,
+        models.DailySalesRollup.business_date <= today.isoformat(),
+        models.DailySalesRollup.dimension.in_([rollup.TOTAL, rollup.ORDER_TYPE, rollup.PAYMENT_METHOD])
+    ).all()
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row.business_date, {})[(row.dimension, row.dimension_value)] = row
     
     summaries = []
-    today = date.today()
-    
     for i in range(days):
-        day = today - timedelta(days=i)
-        day_start = datetime.combine(day, datetime.min.time())
-        day_end = datetime.combine(day, datetime.max.time())
+        day = (today - timedelta(days=i)).isoformat()
+        cells = by_day.get(day, {})
         
-        # Get paid orders for the day
-        orders = db.query(models.Order).filter(
-            models.Order.status == models.OrderStatus.paid,
-            models.Order.paid_at >= day_start,
-            models.Order.paid_at <= day_end
-        ).all()
+        def order_count(dimension, value=""):
+            row = cells.get((dimension, value))
+            return row.order_count if row else 0
         
-        # Get payments
-        payments = db.query(models.Payment).filter(
-            models.Payment.status == models.PaymentStatus.approved,
-            models.Payment.created_at >= day_start,
-            models.Payment.created_at <= day_end
-        ).all()
+        def payment_total(*methods):
+            return sum(cells[(rollup.PAYMENT_METHOD, m.value)].payment_total
+                       for m in methods if (rollup.PAYMENT_METHOD, m.value) in cells)
         
-        total_revenue = sum(o.total for o in orders)
-        order_count = len(orders)
+        total = cells.get((rollup.TOTAL, ""))
+        total_revenue = total.revenue if total else 0
+        count = total.order_count if total else 0
         
         summaries.append(schemas.DailySummary(
-            date=day.isoformat(),
+            date=day,
             total_revenue=total_revenue,
-            order_count=order_count,
-            average_order_value=total_revenue / order_count if order_count > 0 else 0,
-            tip_total=sum(o.tip for o in orders),
-            cash_payments=sum(p.amount for p in payments if p.method == models.PaymentMethod.cash),
-            card_payments=sum(p.amount for p in payments if p.method in [models.PaymentMethod.credit, models.PaymentMethod.debit]),
-            dine_in_orders=len([o for o in orders if o.type == models.OrderType.dine_in]),
-            takeout_orders=len([o for o in orders if o.type == models.OrderType.takeout]),
-            delivery_orders=len([o for o in orders if o.type == models.OrderType.delivery])
+            order_count=count,
+            average_order_value=total_revenue / count if count > 0 else 0,
+            tip_total=total.tip_total if total else 0,
+            cash_payments=payment_total(models.PaymentMethod.cash),
+            card_payments=payment_total(models.PaymentMethod.credit, models.PaymentMethod.debit),
+            dine_in_orders=order_count(rollup.ORDER_TYPE, models.OrderType.dine_in.value),
+            takeout_orders=order_count(rollup.ORDER_TYPE, models.OrderType.takeout.value),
+            delivery_orders=order_count(rollup.ORDER_TYPE, models.OrderType.delivery.value)
         ))
     
     return summaries
 
+@app.get("/api/analytics/top-items", response_model=List[schemas.TopItem])
+async def get_top_items(
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_permission("reports:read"))
+):
+    to_date = to_date or sequences.business_date()
+    from_date = from_date or to_date - timedelta(days=29)
+    # business_date is stored as YYYY-MM-DD text
+    from_date, to_date = from_date.isoformat(), to_date.isoformat()
+    
+    quantity = func.sum(models.DailyItemSales.quantity)
+    revenue = func.sum(models.DailyItemSales.revenue)
+    rows = db.query(
+        func.max(models.DailyItemSales.name), quantity, revenue
+    ).filter(
+        models.DailyItemSales.business_date >= from_date,
+        models.DailyItemSales.business_date <= to_date
+    ).group_by(
+        models.DailyItemSales.menu_item_id
+    ).having(quantity > 0).order_by(quantity.desc(), revenue.desc()).limit(limit).all()
+    
+    return [schemas.TopItem(name=name, quantity=qty, revenue=rev) for name, qty, rev in rows]
+
 # ============== PRINTERS ==============
 
 @app.get("/api/printers", response_model=List[schemas.PrinterResponse])
@@ -653,7 +965,7 @@ async def list_printers(db: Session = Depends(get_db)):
 async def create_printer(
     printer_data: schemas.PrinterCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("settings:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("settings:write"))
 ):
     printer = models.Printer(**printer_data.model_dump())
     db.add(printer)
@@ -665,7 +977,7 @@ async def create_printer(
 async def delete_printer(
     printer_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_permission("settings:write"))
+    current_user: auth.CurrentUser = Depends(auth.require_permission("settings:write"))
 ):
     printer = db.query(models.Printer).filter(models.Printer.id == printer_id).first()
     if not printer:
@@ -675,6 +987,46 @@ async def delete_printer(
     db.commit()
     return {"message": "Printer deleted"}
 
+# ============== EXPORTS ==============
+
+def export_response(name: str, model, columns: list, format: str,
+                    from_date: Optional[date], to_date: Optional[date]):
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    stmt = exports.build_query(model, columns, from_date, to_date)
+    return StreamingResponse(
+        exports.stream(stmt, format),
+        media_type=exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    )
+
+@app.get("/api/exports/audit-logs")
+async def export_audit_logs(
+    format: str = "csv",
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: auth.CurrentUser = Depends(auth.require_permission("audit:read"))
+):
+    return export_response("audit-logs", models.AuditLog, exports.AUDIT_LOG_COLUMNS, format, from_date, to_date)
+
+@app.get("/api/exports/orders")
+async def export_orders(
+    format: str = "csv",
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: auth.CurrentUser = Depends(auth.require_permission("reports:export"))
+):
+    return export_response("orders", models.Order, exports.ORDER_COLUMNS, format, from_date, to_date)
+
+@app.get("/api/exports/payments")
+async def export_payments(
+    format: str = "csv",
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: auth.CurrentUser = Depends(auth.require_permission("reports:export"))
+):
+    return export_response("payments", models.Payment, exports.PAYMENT_COLUMNS, format, from_date, to_date)
+
 # ============== HEALTH CHECK ==============
 
 @app.get("/api/health")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Text, JSON, Enum
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Text, JSON, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -55,6 +55,7 @@ class User(Base):
     email = Column(String, unique=True, nullable=False, index=True)
     full_name = Column(String, nullable=False)
     pin_hash = Column(String, nullable=False)
+    pin_fingerprint = Column(String, index=True)
     role = Column(Enum(UserRole), default=UserRole.server)
     permissions = Column(JSON, default=list)
     is_active = Column(Boolean, default=True)
@@ -105,6 +106,12 @@ class Table(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Keyset pagination: newest first, optionally filtered by status or type
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at", "status", "created_at", "id"),
+        Index("ix_orders_type_created_at", "type", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     order_number = Column(Integer, nullable=False, index=True)
@@ -125,6 +132,10 @@ class Order(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     paid_at = Column(DateTime(timezone=True))
+    # Bumped on every UPDATE; a stale version fails the write (optimistic locking)
+    version = Column(Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {"version_id_col": version}
     
     table = relationship("Table", back_populates="orders", foreign_keys=[table_id])
     server = relationship("User", back_populates="orders")
@@ -170,6 +181,11 @@ class Payment(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_logs_created_at_id", "created_at", "id"),
+        Index("ix_audit_logs_action_created_at", "action", "created_at", "id"),
+        Index("ix_audit_logs_actor_created_at", "actor_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     actor_id = Column(String, ForeignKey("users.id"))
@@ -213,6 +229,42 @@ class PrintJob(Base):
     payload = Column(Text, nullable=False)
     status = Column(String, default="queued")  # queued, printing, completed, failed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Queue polling and retention both filter by status and age
+        Index("ix_print_jobs_status_created_at", "status", "created_at"),
+    )
+
+class DailySalesRollup(Base):
+    __tablename__ = "daily_sales_rollup"
+    
+    # dimension is total, order_type, payment_method or server; dimension_value
+    # is "" for the total row
+    business_date = Column(String, primary_key=True)  # YYYY-MM-DD
+    dimension = Column(String, primary_key=True)
+    dimension_value = Column(String, primary_key=True, default="")
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    tip_total = Column(Float, nullable=False, default=0)
+    payment_count = Column(Integer, nullable=False, default=0)
+    payment_total = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class DailyItemSales(Base):
+    __tablename__ = "daily_item_sales"
+    
+    business_date = Column(String, primary_key=True)  # YYYY-MM-DD
+    menu_item_id = Column(String, ForeignKey("menu_items.id"), primary_key=True)
+    name = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class Sequence(Base):
+    __tablename__ = "sequences"
+    
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class Settings(Base):
     __tablename__ = "settings"
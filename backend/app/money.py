@@ -0,0 +1,50 @@
+"""
+Integer-cents money arithmetic shared by the FastAPI backend and the Flask app.
+
+Amounts are stored as dollars, but every calculation runs on whole cents
+so totals are exact and always recomputed from the lines rather than
+adjusted incrementally. Standard library only, so app.py can import it.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, NamedTuple, Tuple
+
+def to_cents(amount) -> int:
+    """Dollars (float, str, Decimal or int) to whole cents, rounding half up."""
+    if amount is None:
+        return 0
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def to_amount(cents: int) -> float:
+    """Whole cents back to the dollar value stored in the database."""
+    return cents / 100
+
+def normalize(amount) -> float:
+    """Round a dollar amount to the nearest cent, passing None through."""
+    if amount is None:
+        return None
+    return to_amount(to_cents(amount))
+
+def line_cents(price, quantity: int) -> int:
+    return to_cents(price) * quantity
+
+def tax_cents(subtotal_cents: int, rate) -> int:
+    return int((Decimal(subtotal_cents) * Decimal(str(rate))).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+class Totals(NamedTuple):
+    subtotal: int
+    tax: int
+    tip: int
+    discount: int
+    total: int
+
+    def amounts(self) -> Tuple[float, float, float, float, float]:
+        """(subtotal, tax, tip, discount, total) in dollars."""
+        return tuple(to_amount(cents) for cents in self)
+
+def compute_totals(lines: Iterable[Tuple[float, int]], tax_rate, tip=0, discount=0) -> Totals:
+    """Totals for (price, quantity) lines; tax is charged on the subtotal."""
+    subtotal = sum(line_cents(price, quantity) for price, quantity in lines)
+    tax = tax_cents(subtotal, tax_rate)
+    tip_cents = to_cents(tip)
+    discount_cents = to_cents(discount)
+    return Totals(subtotal, tax, tip_cents, discount_cents, subtotal + tax + tip_cents - discount_cents)
@@ -0,0 +1,198 @@
+"""
+Daily sales and per-item sales rollups, maintained as orders are paid and voided.
+Run: python -m app.rollup [--since YYYY-MM-DD]  (rebuild from orders/payments)
+"""
+import argparse
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import SessionLocal, engine, Base
+from .sequences import business_date
+from . import models, migrations, money
+
+settings = get_settings()
+
+TOTAL = "total"
+ORDER_TYPE = "order_type"
+PAYMENT_METHOD = "payment_method"
+SERVER = "server"
+
+def business_date_of(utc_time: datetime) -> str:
+    """Business date for a naive UTC timestamp as stored by the API."""
+    local_time = utc_time.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return business_date(local_time).isoformat()
+
+def _business_date_expr(column):
+    # Same rule as business_date(), evaluated by SQLite for backfills
+    return func.date(column, "localtime", f"-{settings.business_day_start_hour} hours")
+
+METRICS = ("order_count", "revenue", "tip_total", "payment_count", "payment_total")
+
+def _row(day: str, dimension: str, value: str, **metrics) -> dict:
+    row = {"business_date": day, "dimension": dimension, "dimension_value": value}
+    row.update({name: metrics.get(name, 0) for name in METRICS})
+    return row
+
+def _bump(db: Session, day: str, dimension: str, value: str, **deltas):
+    table = models.DailySalesRollup.__table__
+    stmt = insert(table).values(
+        business_date=day, dimension=dimension, dimension_value=value, **deltas
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["business_date", "dimension", "dimension_value"],
+        set_={
+            **{name: table.c[name] + stmt.excluded[name] for name in deltas},
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+
+def _bump_order(db: Session, day: str, order: models.Order, **deltas):
+    _bump(db, day, TOTAL, "", **deltas)
+    _bump(db, day, ORDER_TYPE, models.OrderType(order.type).value, **deltas)
+    if order.server_id:
+        _bump(db, day, SERVER, order.server_id, **deltas)
+
+def _bump_items(db: Session, day: str, order: models.Order, sign: int):
+    lines = {}
+    for item in order.items:
+        name, quantity, cents = lines.get(item.menu_item_id, (item.name, 0, 0))
+        lines[item.menu_item_id] = (
+            name, quantity + item.quantity, cents + money.line_cents(item.price, item.quantity)
+        )
+    
+    table = models.DailyItemSales.__table__
+    for menu_item_id, (name, quantity, cents) in lines.items():
+        stmt = insert(table).values(
+            business_date=day, menu_item_id=menu_item_id, name=name,
+            quantity=sign * quantity, revenue=money.to_amount(sign * cents)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["business_date", "menu_item_id"],
+            set_={
+                "name": stmt.excluded.name,
+                "quantity": table.c.quantity + stmt.excluded.quantity,
+                "revenue": table.c.revenue + stmt.excluded.revenue,
+            },
+        )
+        db.execute(stmt)
+
+def record_payment(
+    db: Session,
+    order: models.Order,
+    payment: models.Payment,
+    was_paid: bool,
+    previous_total: float,
+    previous_tip: float
+):
+    """Apply a payment to the rollup inside the caller's transaction.
+
+    Call after the order has been marked paid. A further payment on an
+    already-paid order only adjusts revenue and tips by the difference.
+    """
+    day = business_date_of(order.paid_at)
+    if was_paid:
+        _bump_order(db, day, order,
+                    revenue=money.to_amount(money.to_cents(order.total) - money.to_cents(previous_total)),
+                    tip_total=money.to_amount(money.to_cents(order.tip) - money.to_cents(previous_tip)))
+    else:
+        _bump_order(db, day, order, order_count=1, revenue=order.total, tip_total=order.tip)
+        _bump_items(db, day, order, 1)
+    _bump(db, business_date_of(datetime.utcnow()), PAYMENT_METHOD,
+          models.PaymentMethod(payment.method).value,
+          payment_count=1, payment_total=payment.amount)
+
+def record_void(db: Session, order: models.Order, was_paid: bool):
+    """Take a voided order back out of its day's totals."""
+    if not was_paid or order.paid_at is None:
+        return
+    day = business_date_of(order.paid_at)
+    _bump_order(db, day, order, order_count=-1, revenue=-order.total, tip_total=-order.tip)
+    _bump_items(db, day, order, -1)
+
+def rebuild(db: Session, since: str = None):
+    """Recompute the rollups from orders and payments, optionally from a business date on."""
+    rollup = models.DailySalesRollup
+    item_sales = models.DailyItemSales
+    for table in (rollup, item_sales):
+        deleted = db.query(table)
+        if since:
+            deleted = deleted.filter(table.business_date >= since)
+        deleted.delete(synchronize_session=False)
+
+    order_day = _business_date_expr(models.Order.paid_at)
+    paid_orders = db.query(models.Order).filter(models.Order.status == models.OrderStatus.paid)
+    if since:
+        paid_orders = paid_orders.filter(order_day >= since)
+    order_columns = (
+        func.count(models.Order.id),
+        func.coalesce(func.sum(models.Order.total), 0),
+        func.coalesce(func.sum(models.Order.tip), 0),
+    )
+    rows = []
+    for dimension, key in ((TOTAL, None), (ORDER_TYPE, models.Order.type), (SERVER, models.Order.server_id)):
+        group = [order_day] + ([key] if key is not None else [])
+        query = paid_orders.with_entities(*group, *order_columns).group_by(*group)
+        if dimension == SERVER:
+            query = query.filter(models.Order.server_id != None)
+        for row in query:
+            day, value, counts = row[0], (row[1] if key is not None else ""), row[-3:]
+            if dimension == ORDER_TYPE:
+                value = models.OrderType(value).value
+            rows.append(_row(day, dimension, value,
+                             order_count=counts[0], revenue=counts[1], tip_total=counts[2]))
+
+    payment_day = _business_date_expr(models.Payment.created_at)
+    payments = db.query(
+        payment_day, models.Payment.method,
+        func.count(models.Payment.id), func.coalesce(func.sum(models.Payment.amount), 0)
+    ).filter(models.Payment.status == models.PaymentStatus.approved)
+    if since:
+        payments = payments.filter(payment_day >= since)
+    for day, method, count, total in payments.group_by(payment_day, models.Payment.method):
+        rows.append(_row(day, PAYMENT_METHOD, models.PaymentMethod(method).value,
+                         payment_count=count, payment_total=total))
+
+    if rows:
+        db.execute(insert(rollup.__table__), rows)
+    
+    lines = paid_orders.join(models.OrderItem, models.OrderItem.order_id == models.Order.id).with_entities(
+        order_day, models.OrderItem.menu_item_id, func.max(models.OrderItem.name),
+        func.sum(models.OrderItem.quantity),
+        # Whole cents per line, as money.line_cents() computes them
+        func.sum(func.round(models.OrderItem.price * 100) * models.OrderItem.quantity)
+    ).group_by(order_day, models.OrderItem.menu_item_id)
+    item_rows = [
+        {"business_date": day, "menu_item_id": menu_item_id, "name": name,
+         "quantity": quantity, "revenue": money.to_amount(int(cents))}
+        for day, menu_item_id, name, quantity, cents in lines
+    ]
+    if item_rows:
+        db.execute(insert(item_sales.__table__), item_rows)
+    db.commit()
+    return len(rows) + len(item_rows)
+
+def backfill_if_empty(db: Session) -> int:
+    """Build the rollups for a database that has paid orders but no rollup yet."""
+    if db.query(models.DailySalesRollup.business_date).first() is not None:
+        return 0
+    paid = db.query(models.Order.id).filter(models.Order.status == models.OrderStatus.paid)
+    if paid.first() is None:
+        return 0
+    return rebuild(db)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily sales rollup")
+    parser.add_argument("--since", help="only rebuild business dates on or after YYYY-MM-DD")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine, Base.metadata)
+    db = SessionLocal()
+    try:
+        print(f"Wrote {rebuild(db, args.since)} rollup rows")
+    finally:
+        db.close()
@@ -156,6 +156,14 @@ class OrderItemUpdate(BaseModel):
     quantity: Optional[int] = None
     notes: Optional[str] = None
 
+class OrderItemBatchUpdate(OrderItemUpdate):
+    id: str
+
+class OrderItemBatch(BaseModel):
+    add: List[OrderItemCreate] = []
+    update: List[OrderItemBatchUpdate] = []
+    remove: List[str] = []
+
 class OrderItemResponse(BaseModel):
     id: str
     menu_item_id: str
@@ -205,6 +213,7 @@ class OrderResponse(OrderBase):
     tip: float
     discount: float
     total: float
+    version: int = 1
     created_at: datetime
     updated_at: Optional[datetime] = None
     paid_at: Optional[datetime] = None
@@ -3,10 +3,10 @@ Seed script to populate initial data
 Run: python -m app.seed
 """
 from .database import SessionLocal, engine, Base
-from . import models, auth
+from . import models, auth, migrations
 
 # Create tables
-Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine, Base.metadata)
 
 def seed_data():
     db = SessionLocal()
@@ -23,6 +23,7 @@ def seed_data():
                 email="admin@dragonpalace.com",
                 full_name="Michael Chen",
                 pin_hash=auth.hash_pin("1234"),
+                pin_fingerprint=auth.pin_fingerprint("1234"),
                 role=models.UserRole.admin,
                 permissions=auth.ROLE_PERMISSIONS["admin"]
             ),
@@ -30,6 +31,7 @@ def seed_data():
                 email="manager@dragonpalace.com",
                 full_name="Sarah Wong",
                 pin_hash=auth.hash_pin("5678"),
+                pin_fingerprint=auth.pin_fingerprint("5678"),
                 role=models.UserRole.manager,
                 permissions=auth.ROLE_PERMISSIONS["manager"]
             ),
@@ -37,6 +39,7 @@ def seed_data():
                 email="server1@dragonpalace.com",
                 full_name="David Liu",
                 pin_hash=auth.hash_pin("1111"),
+                pin_fingerprint=auth.pin_fingerprint("1111"),
                 role=models.UserRole.server,
                 permissions=auth.ROLE_PERMISSIONS["server"]
             ),
@@ -44,6 +47,7 @@ def seed_data():
                 email="cashier@dragonpalace.com",
                 full_name="Kevin Tan",
                 pin_hash=auth.hash_pin("3333"),
+                pin_fingerprint=auth.pin_fingerprint("3333"),
                 role=models.UserRole.cashier,
                 permissions=auth.ROLE_PERMISSIONS["cashier"]
             ),
@@ -0,0 +1,87 @@
+"""
+Database-backed number sequences.
+
+Each process reserves a block of numbers from the sequences table in one
+short transaction and then hands them out from memory (hi/lo), so
+workers never share a number and the order path rarely touches the table.
+"""
+from datetime import date, datetime, timedelta
+import threading
+from typing import Callable
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import SessionLocal
+from . import models
+
+settings = get_settings()
+
+def business_date(at: datetime = None) -> date:
+    """Calendar date of the trading day that `at` (local time) belongs to."""
+    at = at or datetime.now()
+    return (at - timedelta(hours=settings.business_day_start_hour)).date()
+
+class BlockAllocator:
+    def __init__(self, session_factory=SessionLocal, block_size: int = 20):
+        self.session_factory = session_factory
+        self.block_size = block_size
+        self._blocks = {}  # name -> [next value, end of block]
+        self._lock = threading.Lock()
+
+    def next_value(self, name: str, initial: Callable[[Session], int]) -> int:
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                start = self._reserve(name, initial)
+                block = [start, start + self.block_size]
+                self._blocks[name] = block
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def _reserve(self, name: str, initial: Callable[[Session], int]) -> int:
+        db = self.session_factory()
+        try:
+            for _ in range(2):
+                result = db.execute(
+                    update(models.Sequence)
+                    .where(models.Sequence.name == name)
+                    .values(next_value=models.Sequence.next_value + self.block_size)
+                )
+                if result.rowcount:
+                    end = db.execute(
+                        select(models.Sequence.next_value).where(models.Sequence.name == name)
+                    ).scalar_one()
+                    db.commit()
+                    return end - self.block_size
+                
+                # First use of this sequence; another worker may race us to it
+                start = initial(db)
+                db.add(models.Sequence(name=name, next_value=start + self.block_size))
+                try:
+                    db.commit()
+                    return start
+                except IntegrityError:
+                    db.rollback()
+            raise RuntimeError(f"Could not reserve numbers from sequence {name}")
+        finally:
+            db.close()
+
+allocator = BlockAllocator(block_size=settings.order_number_block_size)
+
+def _order_number_after_existing(db: Session) -> int:
+    highest = db.query(func.max(models.Order.order_number)).scalar()
+    return max(settings.order_number_start, (highest or 0) + 1)
+
+def next_order_number() -> int:
+    if settings.order_number_daily_reset:
+        name = f"order_number:{business_date().isoformat()}"
+        return allocator.next_value(name, lambda db: settings.order_number_start)
+    return allocator.next_value("order_number", _order_number_after_existing)
@@ -0,0 +1,115 @@
+"""
+Login latency with PIN fingerprints vs the legacy bcrypt scan, by staff size.
+
+Each staff size runs in its own process against a fresh database. The
+legacy scan verifies every user's bcrypt hash, so at 500 users a single
+legacy login takes minutes; --legacy-logins defaults to 1 for that reason,
+and --legacy-logins 0 skips it.
+
+Run from backend/: python -m benchmarks.bench_login [--users 5 50 500] [--logins 10]
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from fastapi.testclient import TestClient
+
+from app import auth, models
+from app.database import SessionLocal
+from app.main import app
+
+def seed_users(count: int):
+    db = SessionLocal()
+    # Filler users share one hash; they never match the benchmark PIN
+    filler_hash = auth.hash_pin("000000")
+    for n in range(count):
+        db.add(models.User(
+            email=f"bench{n}@dragonpalace.com",
+            full_name=f"User {n}",
+            pin_hash=filler_hash,
+            pin_fingerprint=auth.pin_fingerprint(f"9{n:05d}"),
+            role=models.UserRole.server,
+            permissions=auth.ROLE_PERMISSIONS["server"]
+        ))
+    # The user logging in sorts last, so the legacy scan checks everyone
+    db.add(models.User(
+        email="zz-bench@dragonpalace.com",
+        full_name="Target",
+        pin_hash=auth.hash_pin("4242"),
+        pin_fingerprint=auth.pin_fingerprint("4242"),
+        role=models.UserRole.server,
+        permissions=auth.ROLE_PERMISSIONS["server"]
+    ))
+    db.commit()
+    db.close()
+
+def clear_fingerprints():
+    db = SessionLocal()
+    db.query(models.User).update({models.User.pin_fingerprint: None})
+    db.commit()
+    db.close()
+
+def time_logins(client: TestClient, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = client.post("/api/auth/login", json={"pin": "4242"})
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+    return timings
+
+def measure(users: int, logins: int, legacy_logins: int) -> dict:
+    """Time both login paths against this process's (fresh) database."""
+    seed_users(users)
+    with TestClient(app) as client:
+        fingerprint = time_logins(client, logins)
+        
+        # Every login backfills the target, so clear before each one to
+        # keep measuring the full scan
+        legacy = []
+        for _ in range(legacy_logins):
+            clear_fingerprints()
+            legacy.extend(time_logins(client, 1))
+    return {"fingerprint": fingerprint, "legacy": legacy}
+
+def measure_in_subprocess(users: int, logins: int, legacy_logins: int) -> dict:
+    # A new process gets a new temporary database from the top of this module
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_login", "--json",
+         "--users", str(users), "--logins", str(logins), "--legacy-logins", str(legacy_logins)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+def percentiles(timings: list) -> tuple:
+    timings = sorted(timings)
+    p95 = timings[math.ceil(len(timings) * 0.95) - 1]
+    return statistics.median(timings), p95
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PIN login latency by staff size")
+    parser.add_argument("--users", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--logins", type=int, default=10)
+    parser.add_argument("--legacy-logins", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="measure one size here and print raw timings")
+    args = parser.parse_args()
+    
+    if args.json:
+        print(json.dumps(measure(args.users[0], args.logins, args.legacy_logins)))
+        sys.exit()
+    
+    print(f"{'staff':>6}   {'fingerprint p50':>15} {'p95':>12}   {'legacy scan p50':>15} {'p95':>12}")
+    for users in args.users:
+        timings = measure_in_subprocess(users, args.logins, args.legacy_logins)
+        line = f"{users:>6}   " + "{:12.1f} ms {:9.1f} ms".format(*percentiles(timings["fingerprint"]))
+        if timings["legacy"]:
+            line += "   {:12.1f} ms {:9.1f} ms".format(*percentiles(timings["legacy"]))
+        print(line)
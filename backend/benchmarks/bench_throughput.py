@@ -0,0 +1,119 @@
+"""
+Concurrent order + payment throughput for each DB_PROFILE.
+
+Starts the API under uvicorn once per profile, against a fresh seeded
+database, and has --clients threads each run create order -> add item ->
+pay in a loop for --seconds.
+
+Run from backend/: python -m benchmarks.bench_throughput [--clients 8] [--workers 2]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+PROFILES = ("default", "production")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(profile: str, workers: int) -> tuple:
+    env = dict(
+        os.environ,
+        DB_PROFILE=profile,
+        DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/bench.db",
+    )
+    subprocess.run([sys.executable, "-m", "app.seed"], env=env, check=True, stdout=subprocess.DEVNULL)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base_url}/api/health")
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+def run_client(base_url: str, token: str, menu_item_id: str, deadline: float, results: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    completed, errors, latencies = 0, 0, []
+    with httpx.Client(base_url=base_url, headers=headers, timeout=30) as client:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                order = client.post("/api/orders", json={"type": "takeout"})
+                order.raise_for_status()
+                order = order.json()
+                client.post(
+                    f"/api/orders/{order['id']}/items",
+                    json={"menu_item_id": menu_item_id, "quantity": 2},
+                ).raise_for_status()
+                order = client.get(f"/api/orders/{order['id']}").json()
+                client.post("/api/payments", json={
+                    "order_id": order["id"], "method": "credit", "amount": order["total"]
+                }).raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            completed += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+    results.append((completed, errors, latencies))
+
+def measure(profile: str, clients: int, workers: int, seconds: float) -> dict:
+    server, base_url = start_server(profile, workers)
+    try:
+        token = httpx.post(f"{base_url}/api/auth/login", json={"pin": "1234"}).json()["access_token"]
+        menu_item_id = httpx.get(f"{base_url}/api/menu").json()[0]["id"]
+        results = []
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=run_client, args=(base_url, token, menu_item_id, deadline, results))
+            for _ in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+    latencies = [ms for _, _, client_latencies in results for ms in client_latencies]
+    return {
+        "orders_per_second": sum(completed for completed, _, _ in results) / seconds,
+        "errors": sum(errors for _, errors, _ in results),
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark order + payment throughput per DB profile")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    baseline = None
+    for profile in PROFILES:
+        stats = measure(profile, args.clients, args.workers, args.seconds)
+        if baseline is None:
+            baseline = stats["orders_per_second"]
+        speedup = stats["orders_per_second"] / baseline if baseline else 0.0
+        print(
+            f"{profile:<11} {stats['orders_per_second']:7.1f} orders/s"
+            f"   p50 {stats['p50_ms']:7.1f} ms   errors {stats['errors']:4d}"
+            f"   x{speedup:.2f}"
+        )
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before anything imports it
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/pos.db"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+    from app.seed import seed_data
+    
+    seed_data()
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture(scope="session")
+def headers(client):
+    response = client.post("/api/auth/login", json={"pin": "1234"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def make_order(client, headers):
+    """Create a takeout order with one line; returns (order_id, item_id)."""
+    def make(quantity=2, notes="no onions"):
+        menu_item_id = client.get("/api/menu").json()[0]["id"]
+        order = client.post("/api/orders", json={"type": "takeout"}, headers=headers).json()
+        item = client.post(
+            f"/api/orders/{order['id']}/items",
+            json={"menu_item_id": menu_item_id, "quantity": quantity, "notes": notes},
+            headers=headers
+        ).json()
+        return order["id"], item["id"]
+    return make
+
+@pytest.fixture
+def concurrent_edit(monkeypatch):
+    """Once called, another terminal saves the order between each handler's read and commit."""
+    from app import main
+    from app.database import engine
+    
+    recalculate_totals = main.recalculate_totals
+    def edit_then_recalculate(order):
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE orders SET version = version + 1 WHERE id = :id"), {"id": order.id})
+        recalculate_totals(order)
+    return lambda: monkeypatch.setattr(main, "recalculate_totals", edit_then_recalculate)
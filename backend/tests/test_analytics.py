@@ -0,0 +1,11 @@
+def test_top_items_rejects_invalid_dates(client, headers):
+    assert client.get("/api/analytics/top-items?to=bad", headers=headers).status_code == 422
+    assert client.get("/api/analytics/top-items?from=bad", headers=headers).status_code == 422
+
+def test_top_items_accepts_date_range(client, headers):
+    response = client.get("/api/analytics/top-items?from=2024-01-01&to=2024-01-31", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_top_items_defaults_to_last_30_days(client, headers):
+    assert client.get("/api/analytics/top-items", headers=headers).status_code == 200
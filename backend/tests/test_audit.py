@@ -0,0 +1,59 @@
+import threading
+
+from app import audit, models
+from app.config import get_settings
+from app.database import SessionLocal
+
+def count_actions(action: str, entity_id: str = None) -> int:
+    db = SessionLocal()
+    try:
+        query = db.query(models.AuditLog).filter(models.AuditLog.action == action)
+        if entity_id:
+            query = query.filter(models.AuditLog.entity_id == entity_id)
+        return query.count()
+    finally:
+        db.close()
+
+def test_full_queue_writes_inline_instead_of_blocking(client, monkeypatch):
+    writer = audit.AuditWriter(max_queue=1)
+    # No background thread, so nothing drains the queue
+    monkeypatch.setattr(writer, "start", lambda: None)
+    writer.enqueue(audit.build_row(None, "audit_test_queued", "test"))
+    
+    done = threading.Event()
+    def enqueue():
+        writer.enqueue(audit.build_row(None, "audit_test_overflow", "test"))
+        done.set()
+    
+    threading.Thread(target=enqueue, daemon=True).start()
+    assert done.wait(5), "enqueue blocked on a full queue"
+    assert count_actions("audit_test_overflow") == 1
+    
+    writer.stop()
+    assert writer.metrics()["overflow_writes"] == 1
+    assert count_actions("audit_test_queued") == 1
+
+def test_async_rows_are_written_after_commit(client, headers, make_order, monkeypatch):
+    monkeypatch.setattr(get_settings(), "audit_log_mode", "async")
+    order_id, item_id = make_order()
+    
+    response = client.put(f"/api/orders/{order_id}/items/{item_id}", json={"notes": "extra sauce"}, headers=headers)
+    assert response.status_code == 200
+    
+    audit.writer.stop()
+    assert count_actions("item_modify", item_id) == 1
+
+def test_async_rows_are_dropped_when_the_transaction_rolls_back(
+    client, headers, make_order, concurrent_edit, monkeypatch
+):
+    monkeypatch.setattr(get_settings(), "audit_log_mode", "async")
+    order_id, item_id = make_order()
+    concurrent_edit()
+    
+    response = client.put(f"/api/orders/{order_id}/items/{item_id}", json={"notes": "extra sauce"}, headers=headers)
+    assert response.status_code == 409
+    
+    audit.writer.stop()
+    assert count_actions("item_modify", item_id) == 0
+    items = client.get(f"/api/orders/{order_id}", headers=headers).json()["items"]
+    assert items[0]["notes"] == "no onions"
@@ -0,0 +1,68 @@
+from app import auth, models
+from app.database import SessionLocal
+
+def set_fingerprint(email: str, fingerprint):
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == email).one()
+        user.pin_fingerprint = fingerprint
+        db.commit()
+    finally:
+        db.close()
+
+def get_fingerprint(email: str):
+    db = SessionLocal()
+    try:
+        return db.query(models.User).filter(models.User.email == email).one().pin_fingerprint
+    finally:
+        db.close()
+
+def test_login_by_fingerprint(client):
+    response = client.post("/api/auth/login", json={"pin": "5678"})
+    assert response.status_code == 200
+    assert response.json()["user"]["email"] == "manager@dragonpalace.com"
+
+def test_wrong_pin_is_rejected(client):
+    assert client.post("/api/auth/login", json={"pin": "0000"}).status_code == 401
+
+def test_login_backfills_missing_fingerprint(client):
+    set_fingerprint("server1@dragonpalace.com", None)
+    
+    assert client.post("/api/auth/login", json={"pin": "1111"}).status_code == 200
+    assert get_fingerprint("server1@dragonpalace.com") == auth.pin_fingerprint("1111")
+
+def test_login_recomputes_fingerprint_from_rotated_key(client):
+    # A fingerprint made with a previous SECRET_KEY has a different key id
+    set_fingerprint("cashier@dragonpalace.com", "00000000:" + "0" * 64)
+    
+    assert client.post("/api/auth/login", json={"pin": "3333"}).status_code == 200
+    assert get_fingerprint("cashier@dragonpalace.com") == auth.pin_fingerprint("3333")
+
+def create_user(client, headers, pin: str, role: str) -> tuple:
+    """Create a user and log them in; returns (user_id, auth headers, token)."""
+    response = client.post("/api/users", json={
+        "email": f"user{pin}@dragonpalace.com", "full_name": f"User {pin}", "role": role, "pin": pin
+    }, headers=headers)
+    assert response.status_code == 200
+    token = client.post("/api/auth/login", json={"pin": pin}).json()["access_token"]
+    return response.json()["id"], {"Authorization": f"Bearer {token}"}, token
+
+def test_role_change_applies_to_cached_tokens(client, headers):
+    user_id, user_headers, token = create_user(client, headers, "7401", "manager")
+    assert client.get("/api/analytics/daily", headers=user_headers).status_code == 200
+    assert auth.token_cache.get(token) is not None
+    
+    response = client.put(f"/api/users/{user_id}", json={"role": "server"}, headers=headers)
+    assert response.status_code == 200
+    
+    assert client.get("/api/analytics/daily", headers=user_headers).status_code == 403
+    assert client.get("/api/orders", headers=user_headers).status_code == 200
+
+def test_deleted_user_is_rejected_on_the_next_request(client, headers):
+    user_id, user_headers, token = create_user(client, headers, "7402", "server")
+    assert client.get("/api/orders", headers=user_headers).status_code == 200
+    assert auth.token_cache.get(token) is not None
+    
+    assert client.delete(f"/api/users/{user_id}", headers=headers).status_code == 200
+    
+    assert client.get("/api/orders", headers=user_headers).status_code == 401
@@ -0,0 +1,14 @@
+from app import catalog
+
+def test_menu_cache_ignores_unknown_categories(client):
+    category = client.get("/api/menu").json()[0]["category"]
+    assert client.get(f"/api/menu?category={category}").json()
+    cached = set(catalog.menu_snapshot._responses)
+    
+    for n in range(50):
+        response = client.get(f"/api/menu?category=x{n}")
+        assert response.status_code == 200
+        assert response.json() == []
+    
+    assert set(catalog.menu_snapshot._responses) == cached
+    assert (category, True) in cached
@@ -0,0 +1,14 @@
+from types import SimpleNamespace
+
+from app.database import engine_options
+
+def production(database_url: str) -> SimpleNamespace:
+    return SimpleNamespace(database_url=database_url, db_profile="production", db_pool_size=5, db_max_overflow=10)
+
+def test_sqlite_file_skips_pre_ping():
+    options = engine_options(production("sqlite:///./pos.db"))
+    assert "pool_pre_ping" not in options
+    assert options["pool_size"] == 5
+
+def test_server_databases_pre_ping():
+    assert engine_options(production("postgresql://pos@db/pos"))["pool_pre_ping"] is True
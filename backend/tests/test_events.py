@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+from app import events
+
+async def next_frame(stream, timeout=2):
+    return await asyncio.wait_for(stream.__anext__(), timeout)
+
+def test_astream_wakes_on_publish_from_another_thread():
+    bus = events.EventBus()
+    
+    async def run():
+        stream = bus.astream()
+        pending = asyncio.ensure_future(next_frame(stream))
+        await asyncio.sleep(0.05)
+        threading.Thread(target=bus.publish, args=("order.created", {"id": "o1"})).start()
+        frame = await pending
+        await stream.aclose()
+        return frame
+    
+    frame = asyncio.run(run())
+    assert frame.startswith(b"id: ")
+    assert b"event: order.created" in frame
+    assert not bus._subscribers
+
+def test_astream_resumes_sends_keep_alive_and_ends_on_close():
+    bus = events.EventBus()
+    first = bus.publish("table.updated", {"id": "t1"})
+    bus.publish("table.updated", {"id": "t2"})
+    
+    async def run():
+        stream = bus.astream(str(first.id), heartbeat=0.05)
+        frames = [await next_frame(stream), await next_frame(stream)]
+        bus.close()
+        return frames, [frame async for frame in stream]
+    
+    frames, after_close = asyncio.run(run())
+    assert b'"t2"' in frames[0]
+    assert frames[1] == events.KEEP_ALIVE
+    assert after_close == []
+    assert not bus._subscribers
+
+def test_astream_resyncs_a_bad_last_event_id():
+    bus = events.EventBus()
+    
+    async def run():
+        stream = bus.astream("not-a-number")
+        frame = await next_frame(stream)
+        await stream.aclose()
+        return frame
+    
+    assert asyncio.run(run()) == events.RESYNC
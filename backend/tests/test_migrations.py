@@ -0,0 +1,116 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app import migrations, models
+from app.database import Base
+
+LEGACY_USERS = """
+CREATE TABLE users (
+    id VARCHAR NOT NULL,
+    email VARCHAR NOT NULL,
+    full_name VARCHAR NOT NULL,
+    pin_hash VARCHAR NOT NULL,
+    role VARCHAR(7),
+    permissions JSON,
+    is_active BOOLEAN,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME,
+    PRIMARY KEY (id)
+)
+"""
+
+LEGACY_ORDERS = """
+CREATE TABLE orders (
+    id VARCHAR NOT NULL,
+    order_number INTEGER NOT NULL,
+    type VARCHAR(8) NOT NULL,
+    status VARCHAR(9),
+    table_id VARCHAR,
+    table_label VARCHAR,
+    server_id VARCHAR,
+    subtotal FLOAT,
+    tax FLOAT,
+    tip FLOAT,
+    discount FLOAT,
+    total FLOAT,
+    guest_count INTEGER,
+    notes TEXT,
+    delivery_address VARCHAR,
+    delivery_contact VARCHAR,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME,
+    paid_at DATETIME,
+    PRIMARY KEY (id)
+)
+"""
+
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_USERS))
+        conn.execute(text(LEGACY_ORDERS))
+        conn.execute(text(
+            "INSERT INTO users (id, email, full_name, pin_hash, role, is_active) "
+            "VALUES ('u1', 'a@b.c', 'A', 'x', 'admin', 1)"
+        ))
+        conn.execute(text(
+            "INSERT INTO orders (id, order_number, type, status, total) "
+            "VALUES ('o1', 1, 'takeout', 'open', 0)"
+        ))
+    return engine
+
+def test_upgrade_adds_missing_columns_and_indexes(tmp_path):
+    engine = legacy_engine(tmp_path)
+    
+    migrations.upgrade(engine, Base.metadata)
+    
+    inspector = inspect(engine)
+    assert "pin_fingerprint" in {c["name"] for c in inspector.get_columns("users")}
+    assert "ix_users_pin_fingerprint" in {i["name"] for i in inspector.get_indexes("users")}
+    with Session(engine) as db:
+        user = db.query(models.User).one()
+        assert user.pin_fingerprint is None
+
+def test_upgrade_adds_order_version_to_existing_orders(tmp_path):
+    engine = legacy_engine(tmp_path)
+    
+    migrations.upgrade(engine, Base.metadata)
+    
+    with Session(engine) as db:
+        order = db.query(models.Order).one()
+        assert order.version == 1
+        order.notes = "edited"
+        db.commit()
+        assert order.version == 2
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = legacy_engine(tmp_path)
+    
+    migrations.upgrade(engine, Base.metadata)
+    migrations.upgrade(engine, Base.metadata)
+
+def test_upgrade_skips_indexes_on_missing_columns(tmp_path, monkeypatch):
+    engine = legacy_engine(tmp_path)
+    monkeypatch.setattr(migrations, "ADDED_COLUMNS", [])
+    
+    migrations.upgrade(engine, Base.metadata)
+    
+    assert "ix_users_pin_fingerprint" not in {i["name"] for i in inspect(engine).get_indexes("users")}
+
+def test_order_listing_uses_keyset_indexes(client):
+    from app.database import engine
+    
+    def plan(sql):
+        with engine.connect() as conn:
+            return " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    
+    newest = plan("SELECT id FROM orders ORDER BY created_at DESC, id DESC LIMIT 100")
+    assert "ix_orders_created_at_id" in newest
+    assert "TEMP B-TREE" not in newest
+    
+    by_status = plan(
+        "SELECT id FROM orders WHERE status = 'open' "
+        "ORDER BY created_at DESC, id DESC LIMIT 100"
+    )
+    assert "ix_orders_status_created_at" in by_status
+    assert "TEMP B-TREE" not in by_status
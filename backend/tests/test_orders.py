@@ -0,0 +1,98 @@
+from sqlalchemy import event
+
+from app.database import engine
+
+def count_statements(client, url, headers):
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return len(statements), response.json()
+
+def test_list_orders_query_count_does_not_grow_with_orders(client, headers):
+    menu_item_id = client.get("/api/menu").json()[0]["id"]
+    for _ in range(6):
+        order = client.post("/api/orders", json={"type": "takeout"}, headers=headers).json()
+        client.post(
+            f"/api/orders/{order['id']}/items",
+            json={"menu_item_id": menu_item_id, "quantity": 1},
+            headers=headers
+        )
+    
+    one, orders = count_statements(client, "/api/orders?limit=1", headers)
+    assert len(orders) == 1
+    many, orders = count_statements(client, "/api/orders?limit=6", headers)
+    assert len(orders) == 6
+    assert many == one
+
+def test_batch_rejects_duplicate_item_ids(client, headers, make_order):
+    order_id, item_id = make_order()
+    url = f"/api/orders/{order_id}/items/batch"
+    
+    response = client.post(url, json={"remove": [item_id, item_id]}, headers=headers)
+    assert response.status_code == 400
+    response = client.post(url, json={"update": [{"id": item_id, "quantity": 3}, {"id": item_id, "quantity": 4}]}, headers=headers)
+    assert response.status_code == 400
+    response = client.post(url, json={"remove": [item_id], "update": [{"id": item_id, "quantity": 3}]}, headers=headers)
+    assert response.status_code == 400
+    assert client.get(f"/api/orders/{order_id}", headers=headers).json()["items"][0]["quantity"] == 2
+
+def test_batch_update_ignores_null_quantity_and_rejects_zero(client, headers, make_order):
+    order_id, item_id = make_order()
+    url = f"/api/orders/{order_id}/items/batch"
+    
+    response = client.post(url, json={"update": [{"id": item_id, "quantity": None, "notes": None}]}, headers=headers)
+    assert response.status_code == 200
+    item = response.json()["items"][0]
+    assert item["quantity"] == 2
+    assert item["notes"] is None
+    
+    response = client.post(url, json={"update": [{"id": item_id, "quantity": 0}]}, headers=headers)
+    assert response.status_code == 400
+
+def item_routes(order_id, item_id, menu_item_id):
+    """(method, url, json) for every route that edits an order's lines."""
+    return [
+        ("post", f"/api/orders/{order_id}/items", {"menu_item_id": menu_item_id, "quantity": 1}),
+        ("put", f"/api/orders/{order_id}/items/{item_id}", {"quantity": 5}),
+        ("delete", f"/api/orders/{order_id}/items/{item_id}", None),
+        ("post", f"/api/orders/{order_id}/items/batch", {"update": [{"id": item_id, "quantity": 5}]}),
+    ]
+
+def test_stale_if_match_gets_409_with_current_version(client, headers, make_order):
+    menu_item_id = client.get("/api/menu").json()[0]["id"]
+    order_id, item_id = make_order()
+    before = client.get(f"/api/orders/{order_id}", headers=headers).json()
+    stale = {**headers, "If-Match": f'"{before["version"] - 1}"'}
+    
+    for method, url, body in item_routes(order_id, item_id, menu_item_id):
+        response = client.request(method, url, json=body, headers=stale)
+        assert response.status_code == 409, url
+        assert response.json()["detail"]["version"] == before["version"]
+    
+    assert client.get(f"/api/orders/{order_id}", headers=headers).json() == before
+    current = {**headers, "If-Match": f'W/"{before["version"]}"'}
+    response = client.put(f"/api/orders/{order_id}/items/{item_id}", json={"quantity": 3}, headers=current)
+    assert response.status_code == 200
+
+def test_edit_racing_another_terminal_gets_409_and_saves_nothing(client, headers, make_order, concurrent_edit):
+    menu_item_id = client.get("/api/menu").json()[0]["id"]
+    order_id, item_id = make_order()
+    concurrent_edit()
+    
+    for method, url, body in item_routes(order_id, item_id, menu_item_id):
+        before = client.get(f"/api/orders/{order_id}", headers=headers).json()
+        response = client.request(method, url, json=body, headers=headers)
+        assert response.status_code == 409, url
+        after = client.get(f"/api/orders/{order_id}", headers=headers).json()
+        # Only the other terminal's save went through
+        assert after["version"] == before["version"] + 1
+        assert after["items"] == before["items"]
+        assert after["total"] == before["total"]
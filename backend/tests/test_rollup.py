@@ -0,0 +1,117 @@
+from datetime import datetime
+
+from app import models, rollup
+from app.database import SessionLocal
+
+def make_paid_order(db, lines, menu_index=0):
+    order = models.Order(
+        order_number=900000 + db.query(models.Order).count(),
+        type=models.OrderType.takeout,
+        status=models.OrderStatus.paid,
+        paid_at=datetime.utcnow(),
+        total=0,
+        tip=0
+    )
+    db.add(order)
+    db.flush()
+    menu_item = db.query(models.MenuItem).order_by(models.MenuItem.sku).offset(menu_index).first()
+    for price, quantity in lines:
+        db.add(models.OrderItem(
+            order_id=order.id, menu_item_id=menu_item.id, name=menu_item.name,
+            price=price, quantity=quantity
+        ))
+    db.flush()
+    return order, menu_item
+
+def test_backfill_if_empty_rebuilds_only_an_empty_rollup(client):
+    db = SessionLocal()
+    try:
+        db.query(models.DailySalesRollup).delete()
+        db.query(models.DailyItemSales).delete()
+        make_paid_order(db, [(0.1, 3)])
+        db.commit()
+        
+        assert rollup.backfill_if_empty(db) > 0
+        assert db.query(models.DailySalesRollup).count() > 0
+        assert rollup.backfill_if_empty(db) == 0
+    finally:
+        db.close()
+
+def test_item_revenue_is_summed_in_cents(client):
+    db = SessionLocal()
+    try:
+        db.query(models.DailySalesRollup).delete()
+        db.query(models.DailyItemSales).delete()
+        # 0.1 * 3 is 0.30000000000000004 in floats
+        order, menu_item = make_paid_order(db, [(0.1, 3), (0.2, 1)], menu_index=1)
+        day = rollup.business_date_of(order.paid_at)
+        rollup._bump_items(db, day, order, 1)
+        db.commit()
+        
+        live = db.query(models.DailyItemSales).filter_by(business_date=day, menu_item_id=menu_item.id).one()
+        assert live.revenue == 0.5
+        
+        rollup.rebuild(db)
+        rebuilt = db.query(models.DailyItemSales).filter_by(business_date=day, menu_item_id=menu_item.id).one()
+        assert rebuilt.revenue == 0.5
+    finally:
+        db.close()
+
+def rollup_snapshot() -> list:
+    db = SessionLocal()
+    try:
+        rows = [
+            (r.business_date, r.dimension, r.dimension_value, r.order_count, r.revenue, r.tip_total, r.payment_total)
+            for r in db.query(models.DailySalesRollup)
+        ]
+        rows += [(r.business_date, r.menu_item_id, r.quantity, r.revenue) for r in db.query(models.DailyItemSales)]
+        # A void leaves zeroed rows behind that a rebuild never creates
+        return sorted((row for row in rows if any(row[3:])), key=repr)
+    finally:
+        db.close()
+
+def test_paid_orders_only_change_through_payments_and_void(client, headers, make_order):
+    db = SessionLocal()
+    try:
+        rollup.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    order_id, item_id = make_order()
+    order = client.get(f"/api/orders/{order_id}", headers=headers).json()
+    response = client.post("/api/payments", json={"order_id": order_id, "method": "credit", "amount": order["total"]}, headers=headers)
+    assert response.status_code == 200
+    paid = rollup_snapshot()
+    
+    menu_item_id = client.get("/api/menu").json()[0]["id"]
+    order_url = f"/api/orders/{order_id}"
+    rejected = [
+        client.put(order_url, json={"status": "voided"}, headers=headers),
+        client.put(order_url, json={"status": "open"}, headers=headers),
+        client.put(order_url, json={"tip": 5}, headers=headers),
+        client.put(order_url, json={"discount": 1}, headers=headers),
+        client.post(f"{order_url}/items", json={"menu_item_id": menu_item_id, "quantity": 1}, headers=headers),
+        client.put(f"{order_url}/items/{item_id}", json={"quantity": 5}, headers=headers),
+        client.delete(f"{order_url}/items/{item_id}", headers=headers),
+        client.post(f"{order_url}/items/batch", json={"remove": [item_id]}, headers=headers),
+        client.post(f"{order_url}/send", headers=headers),
+    ]
+    assert [response.status_code for response in rejected] == [400] * len(rejected)
+    assert client.put(order_url, json={"notes": "picked up"}, headers=headers).status_code == 200
+    assert rollup_snapshot() == paid
+    
+    assert client.post(f"{order_url}/void?reason=test", headers=headers).status_code == 200
+    voided = rollup_snapshot()
+    assert voided != paid
+    db = SessionLocal()
+    try:
+        rollup.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    assert rollup_snapshot() == voided
+
+def test_status_cannot_be_set_to_paid_directly(client, headers, make_order):
+    order_id, _ = make_order()
+    response = client.put(f"/api/orders/{order_id}", json={"status": "paid"}, headers=headers)
+    assert response.status_code == 400
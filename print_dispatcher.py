@@ -0,0 +1,226 @@
+"""Deliver queued print jobs to network ESC/POS printers.
+
+Run alongside the Flask app:
+
+    python print_dispatcher.py
+
+Each printer gets its own worker thread, so a jammed or unreachable
+printer only delays its own jobs. Workers claim jobs atomically, stream
+the payload over TCP (port 9100 unless the device identifier says
+otherwise) and move the job to completed, or back to queued with
+exponential backoff until MAX_ATTEMPTS is reached and it is marked failed.
+
+Once an hour it also runs print job retention (see compact_print_jobs in
+app.py); `python print_dispatcher.py --compact` runs it once.
+
+For local testing, `python print_dispatcher.py --fake-printer 9100`
+starts a printer that accepts jobs and prints what it receives.
+"""
+import argparse
+from datetime import datetime, timedelta
+import socket
+import socketserver
+import threading
+import time
+
+from app import (
+    DEFAULT_PRINTER_PORT,
+    compact_print_jobs,
+    connect_db,
+    parse_printer_address,
+)
+
+POLL_INTERVAL = 0.5
+PRINTER_REFRESH_INTERVAL = 10
+COMPACT_INTERVAL = 3600
+SEND_TIMEOUT = 5
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2
+BACKOFF_MAX = 60
+
+
+def send_payload(device_identifier, payload, timeout=SEND_TIMEOUT):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    with socket.create_connection(parse_printer_address(device_identifier), timeout=timeout) as sock:
+        sock.sendall(payload)
+
+
+def backoff_seconds(attempts):
+    return min(BACKOFF_BASE ** attempts, BACKOFF_MAX)
+
+
+def requeue_interrupted_jobs(connection):
+    """Jobs left in 'printing' by a dispatcher that died get another try."""
+    connection.execute("UPDATE print_jobs SET status = 'queued' WHERE status = 'printing'")
+    connection.commit()
+
+
+def claim_next_job(connection, printer_id):
+    now = datetime.utcnow().isoformat()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            """
+            SELECT id, payload, attempts FROM print_jobs
+            WHERE printer_id = ? AND status = 'queued'
+                AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+            ORDER BY created_at, id
+            LIMIT 1
+            """,
+            (printer_id, now),
+        ).fetchone()
+        if row:
+            connection.execute(
+                "UPDATE print_jobs SET status = 'printing', attempts = attempts + 1 WHERE id = ?",
+                (row["id"],),
+            )
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return dict(row) if row else None
+
+
+def mark_completed(connection, job_id):
+    connection.execute(
+        """
+        UPDATE print_jobs
+        SET status = 'completed', completed_at = ?, last_error = NULL
+        WHERE id = ?
+        """,
+        (datetime.utcnow().isoformat(), job_id),
+    )
+
+
+def mark_failed_attempt(connection, job, error):
+    attempts = job["attempts"] + 1
+    if attempts >= MAX_ATTEMPTS:
+        connection.execute(
+            "UPDATE print_jobs SET status = 'failed', last_error = ? WHERE id = ?",
+            (str(error), job["id"]),
+        )
+        return
+    retry_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts))
+    connection.execute(
+        """
+        UPDATE print_jobs
+        SET status = 'queued', next_attempt_at = ?, last_error = ?
+        WHERE id = ?
+        """,
+        (retry_at.isoformat(), str(error), job["id"]),
+    )
+
+
+class PrinterWorker(threading.Thread):
+    def __init__(self, printer):
+        super().__init__(name=f"printer-{printer['id']}", daemon=True)
+        self.printer = printer
+        self.stopping = threading.Event()
+
+    def run(self):
+        connection = connect_db()
+        # Transactions are managed explicitly around each claim
+        connection.isolation_level = None
+        try:
+            while not self.stopping.is_set():
+                job = claim_next_job(connection, self.printer["id"])
+                if not job:
+                    self.stopping.wait(POLL_INTERVAL)
+                    continue
+                try:
+                    send_payload(self.printer["device_identifier"], job["payload"])
+                    mark_completed(connection, job["id"])
+                except Exception as error:
+                    # A bad address or a locked database must not kill the
+                    # worker and strand the job in 'printing'
+                    mark_failed_attempt(connection, job, error)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopping.set()
+
+
+class Dispatcher:
+    def __init__(self):
+        self.workers = {}
+
+    def load_printers(self, connection):
+        rows = connection.execute(
+            "SELECT * FROM printers WHERE connection_type = 'escpos'"
+        ).fetchall()
+        return {row["id"]: dict(row) for row in rows}
+
+    def sync_workers(self, connection):
+        printers = self.load_printers(connection)
+        for printer_id, worker in list(self.workers.items()):
+            current = printers.get(printer_id)
+            if current is None or current != worker.printer or not worker.is_alive():
+                worker.stop()
+                del self.workers[printer_id]
+        for printer_id, printer in printers.items():
+            if printer_id not in self.workers:
+                worker = PrinterWorker(printer)
+                worker.start()
+                self.workers[printer_id] = worker
+
+    def run(self):
+        connection = connect_db()
+        try:
+            requeue_interrupted_jobs(connection)
+            compacted_at = None
+            while True:
+                self.sync_workers(connection)
+                if compacted_at is None or time.monotonic() - compacted_at >= COMPACT_INTERVAL:
+                    compact_print_jobs(connection)
+                    compacted_at = time.monotonic()
+                time.sleep(PRINTER_REFRESH_INTERVAL)
+        finally:
+            for worker in self.workers.values():
+                worker.stop()
+            connection.close()
+
+
+class FakePrinterHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        chunks = []
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                break
+            chunks.append(data)
+        payload = b"".join(chunks)
+        self.server.received.append(payload)
+        print(f"--- {len(payload)} bytes from {self.client_address[0]} ---")
+        print(payload.decode("utf-8", errors="replace"))
+
+
+class FakePrinter(socketserver.ThreadingTCPServer):
+    """A TCP server that accepts print jobs like an ESC/POS network printer."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PRINTER_PORT):
+        super().__init__((host, port), FakePrinterHandler)
+        self.received = []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fake-printer", type=int, metavar="PORT")
+    parser.add_argument(
+        "--compact", action="store_true", help="run print job retention once and exit"
+    )
+    args = parser.parse_args()
+    if args.compact:
+        connection = connect_db()
+        cleared, archived = compact_print_jobs(connection)
+        connection.close()
+        print(f"Cleared {cleared} payloads, archived {archived} jobs")
+    elif args.fake_printer:
+        with FakePrinter(port=args.fake_printer) as server:
+            server.serve_forever()
+    else:
+        Dispatcher().run()
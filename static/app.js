@@ -8,6 +8,7 @@ const state = {
   activeFilters: new Set(),
   currentOrderId: null,
   lastOrderTotal: 0,
+  printJobs: [],
 };
 
 const currencyFormatter = new Intl.NumberFormat("en-US", {
@@ -599,7 +600,30 @@ const refreshPrinterConfig = async () => {
   const jobsData = await jobsResponse.json();
   renderPrinterList(printersData.printers || []);
   renderPrinterOptions(printersData.printers || [], mappingData.mapping || {});
-  renderPrintJobs(jobsData.jobs || []);
+  state.printJobs = jobsData.jobs || [];
+  renderPrintJobs(state.printJobs);
+};
+
+const upsertPrintJob = (job) => {
+  const index = state.printJobs.findIndex((existing) => existing.id === job.id);
+  if (index === -1) {
+    state.printJobs = [job, ...state.printJobs].slice(0, 20);
+  } else {
+    state.printJobs[index] = job;
+  }
+  renderPrintJobs(state.printJobs);
+};
+
+const subscribeToEvents = () => {
+  if (!window.EventSource) return;
+  // EventSource reconnects on its own and resumes from Last-Event-ID
+  const source = new EventSource("/api/events");
+  source.addEventListener("print_job.updated", (event) => {
+    upsertPrintJob(JSON.parse(event.data));
+  });
+  source.addEventListener("resync", () => {
+    refreshPrinterConfig();
+  });
 };
 
 tipInput.addEventListener("input", (event) => {
@@ -717,3 +741,4 @@ renderTicket();
 renderReceipt();
 updateOrderTypeUI();
 updatePaymentControls();
+subscribeToEvents();
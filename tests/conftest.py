@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "orders.db"))
+    # Request handlers reuse a per-thread connection; open a fresh one
+    monkeypatch.setattr(app._local, "connection", None, raising=False)
+    app.init_db()
+    app.invalidate_printer_config()
+    connection = app.connect_db()
+    yield connection
+    connection.close()
+    if app._local.connection is not None:
+        app._local.connection.close()
+    app.invalidate_printer_config()
+
+
+@pytest.fixture
+def add_printer(connection):
+    def add(connection_type, device_identifier, name="Test"):
+        cursor = connection.execute(
+            """
+            INSERT INTO printers (name, connection_type, device_identifier, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (name, connection_type, device_identifier, datetime.utcnow().isoformat()),
+        )
+        connection.commit()
+        app.invalidate_printer_config()
+        row = connection.execute(
+            "SELECT * FROM printers WHERE id = ?", (cursor.lastrowid,)
+        ).fetchone()
+        return dict(row)
+
+    return add
@@ -0,0 +1,129 @@
+from datetime import datetime
+import threading
+import time
+
+import pytest
+
+import app
+import print_dispatcher
+
+
+@pytest.fixture
+def fake_printer():
+    server = print_dispatcher.FakePrinter(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def queue_job(connection, printer, payload=b"ticket"):
+    job_id = app.queue_print_job(connection, None, None, "kitchen", printer, payload)
+    connection.commit()
+    return job_id
+
+
+def wait_for_job(connection, job_id, done):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = dict(connection.execute("SELECT * FROM print_jobs WHERE id = ?", (job_id,)).fetchone())
+        if done(job):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} is still {job['status']}")
+
+
+def run_worker(printer):
+    worker = print_dispatcher.PrinterWorker(printer)
+    worker.start()
+    return worker
+
+
+def test_worker_delivers_jobs_to_printer(connection, add_printer, fake_printer):
+    port = fake_printer.server_address[1]
+    printer = add_printer("escpos", f"127.0.0.1:{port}")
+    job_id = queue_job(connection, printer, b"\x1b@Order #1")
+
+    worker = run_worker(printer)
+    try:
+        job = wait_for_job(connection, job_id, lambda job: job["status"] == "completed")
+    finally:
+        worker.stop()
+        worker.join()
+
+    assert job["attempts"] == 1
+    assert job["completed_at"]
+    assert fake_printer.received == [b"\x1b@Order #1"]
+
+
+def test_worker_survives_a_bad_address(connection, add_printer):
+    # Stored before addresses were validated on create
+    printer = add_printer("escpos", "kitchen-printer:ninety-one-hundred")
+    job_id = queue_job(connection, printer)
+
+    worker = run_worker(printer)
+    try:
+        job = wait_for_job(connection, job_id, lambda job: job["last_error"])
+        assert worker.is_alive()
+    finally:
+        worker.stop()
+        worker.join()
+
+    assert job["status"] == "queued"
+    assert job["next_attempt_at"]
+
+
+@pytest.mark.parametrize(
+    "device_identifier, expected",
+    [
+        ("192.168.1.50", ("192.168.1.50", 9100)),
+        (" kitchen.local:9101 ", ("kitchen.local", 9101)),
+    ],
+)
+def test_parse_printer_address(device_identifier, expected):
+    assert app.parse_printer_address(device_identifier) == expected
+
+
+@pytest.mark.parametrize(
+    "device_identifier", ["printer:abc", ":9100", "printer:", "printer:70000", "two words"]
+)
+def test_parse_printer_address_rejects_invalid(device_identifier):
+    with pytest.raises(ValueError):
+        app.parse_printer_address(device_identifier)
+
+
+def test_create_printer_validates_escpos_address(connection):
+    client = app.app.test_client()
+
+    response = client.post(
+        "/api/printers",
+        json={"name": "Bar", "connectionType": "escpos", "deviceIdentifier": "bar:port"},
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "/api/printers",
+        json={"name": "Bar", "connectionType": "escpos", "deviceIdentifier": "bar:9100"},
+    )
+    assert response.status_code == 201
+    response = client.post(
+        "/api/printers",
+        json={"name": "Office", "connectionType": "driver", "deviceIdentifier": "Office Laser"},
+    )
+    assert response.status_code == 201
+
+
+def test_driver_printers_are_not_queued(connection, add_printer):
+    printer = add_printer("driver", "Office Laser")
+    connection.execute(
+        "UPDATE printer_mappings SET kitchen_printer_id = ?, receipt_printer_id = ?",
+        (printer["id"], printer["id"]),
+    )
+    connection.commit()
+    app.invalidate_printer_config()
+    items = [{"sku": "none", "name": "Rice", "quantity": 1, "price": 2.0}]
+    order = {"id": 1, "ticket_type": "takeout", "created_at": datetime.utcnow().isoformat()}
+
+    assert app.queue_station_tickets(connection, order, items) == []
+    assert app.queue_receipt(connection, order, {"id": 1, "method": "cash"}) is None
+    assert connection.execute("SELECT COUNT(*) FROM print_jobs").fetchone()[0] == 0
@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(connection):
+    return app.app.test_client()
+
+
+@pytest.fixture
+def printers(add_printer):
+    return {
+        "kitchen": add_printer("escpos", "10.0.0.1", name="Kitchen"),
+        "dimsum": add_printer("escpos", "10.0.0.2", name="Dim Sum"),
+        "raw": add_printer("escpos", "10.0.0.3", name="Raw Bar"),
+        "office": add_printer("driver", "Office Laser", name="Office"),
+    }
+
+
+def item(sku, quantity=1):
+    menu_item = app.MENU_BY_SKU.get(sku)
+    name = menu_item.name if menu_item else "Off-menu special"
+    return {"sku": sku, "name": name, "quantity": quantity, "price": 5.0}
+
+
+def route(match_type, match_value, station, printer):
+    return {
+        "matchType": match_type,
+        "matchValue": match_value,
+        "station": station,
+        "printerId": printer["id"],
+    }
+
+
+def set_kitchen_printer(client, printer):
+    response = client.put("/api/printer-mappings", json={"kitchenPrinterId": printer["id"]})
+    assert response.status_code == 200
+
+
+def test_route_items_prefers_tags_and_defaults_to_kitchen(client, printers):
+    set_kitchen_printer(client, printers["kitchen"])
+    response = client.put(
+        "/api/print-routes",
+        json={
+            "routes": [
+                route("category", "Dimsum", "dimsum", printers["dimsum"]),
+                route("tag", "seafood", "raw", printers["raw"]),
+            ]
+        },
+    )
+    assert response.status_code == 200
+    config = app.printer_config(app.connect_db().cursor())
+    items = [item("DS-01", 2), item("DS-02"), item("LN-01"), item("XX-99")]
+
+    routed = app.route_items(config.routes, items, config.kitchen_printer_id)
+
+    assert {key: [line["sku"] for line in lines] for key, lines in routed.items()} == {
+        ("raw", printers["raw"]["id"]): ["DS-01"],
+        ("dimsum", printers["dimsum"]["id"]): ["DS-02"],
+        ("kitchen", printers["kitchen"]["id"]): ["LN-01", "XX-99"],
+    }
+
+
+@pytest.mark.parametrize("field", ["kitchenPrinterId", "receiptPrinterId"])
+def test_mappings_reject_driver_printers(client, printers, field):
+    response = client.put("/api/printer-mappings", json={field: printers["office"]["id"]})
+    assert response.status_code == 400
+
+
+def test_routes_reject_driver_printers(client, printers):
+    response = client.put(
+        "/api/print-routes",
+        json={"routes": [route("category", "Dimsum", "dimsum", printers["office"])]},
+    )
+    assert response.status_code == 400
+    assert client.get("/api/print-routes").get_json()["routes"] == []
+
+
+def test_items_routed_to_a_driver_printer_fall_back_to_kitchen(connection, client, printers):
+    set_kitchen_printer(client, printers["kitchen"])
+    # Saved before routes were limited to ESC/POS printers
+    connection.execute(
+        """
+        INSERT INTO print_routes (match_type, match_value, station, printer_id, created_at)
+        VALUES ('category', 'Dimsum', 'dimsum', ?, ?)
+        """,
+        (printers["office"]["id"], datetime.utcnow().isoformat()),
+    )
+    connection.commit()
+    app.invalidate_printer_config()
+
+    response = client.post(
+        "/api/orders",
+        json={
+            "orderType": "takeout",
+            "items": [{"sku": "DS-01", "quantity": 2}, {"sku": "LN-01", "quantity": 1}],
+        },
+    )
+    assert response.status_code == 200
+
+    jobs = connection.execute("SELECT * FROM print_jobs").fetchall()
+    assert len(jobs) == 1
+    job = jobs[0]
+    assert job["printer_id"] == printers["kitchen"]["id"]
+    assert b"Shrimp Dumplings" in job["payload"]
+    assert b"Kung Pao Chicken" in job["payload"]
@@ -0,0 +1,95 @@
+import pytest
+
+import tickets
+from tickets import LF, LINE_WIDTH
+
+CUT = LF * 3 + tickets.FEED_AND_CUT
+
+
+def render(*ops, escpos=True, **context):
+    """Render ops as a ticket and return the bytes between INIT and the cut."""
+    data = tickets.render_bytes(tickets.Template(*ops), context, escpos=escpos)
+    if escpos:
+        assert data.startswith(tickets.INIT)
+        assert data.endswith(CUT)
+        return data[len(tickets.INIT) : -len(CUT)]
+    # Driver printers get neither the init nor the cut commands
+    return data
+
+
+def test_styled_text_wraps_in_escpos_sequences():
+    data = render(tickets.text("Order #{id}", bold=True, tall=True, center=True), id=7)
+    assert data == (
+        b"\x1ba\x01\x1bE\x01\x1d!\x01" b"Order #7" b"\x1ba\x00\x1bE\x00\x1d!\x00\n"
+    )
+
+
+def test_plain_text_has_no_commands_and_centres_with_spaces():
+    data = render(tickets.text("Hi", bold=True, center=True), escpos=False)
+    assert data == b"Hi".center(LINE_WIDTH).rstrip() + LF
+
+
+def test_template_starts_with_init_and_ends_with_feed_and_cut():
+    data = tickets.render_bytes(tickets.Template(tickets.blank()), {})
+    assert data == b"\x1b@" + LF + LF * 3 + b"\x1dV\x42\x03"
+
+
+def test_chinese_is_wrapped_in_fs_and_encoded_as_gb18030():
+    data = render(tickets.chinese("name_chinese", indent=4, tall=True), name_chinese="蝦餃")
+    assert data == (
+        b"    " + b"\x1d!\x01\x1c&" + "蝦餃".encode("gb18030") + b"\x1c.\x1d!\x00\n"
+    )
+
+
+def test_chinese_is_utf8_for_driver_printers():
+    data = render(tickets.chinese("name_chinese"), escpos=False, name_chinese="蝦餃")
+    assert data == "蝦餃".encode("utf-8") + LF
+
+
+def test_chinese_line_is_skipped_when_field_is_empty():
+    assert render(tickets.chinese("name_chinese"), name_chinese=None) == b""
+
+
+def test_columns_pad_to_line_width():
+    data = render(tickets.columns("Subtotal", "${amount:.2f}"), amount=12.5)
+    line = b"Subtotal" + b" " * (LINE_WIDTH - len("Subtotal") - len("$12.50")) + b"$12.50"
+    assert len(line) == LINE_WIDTH
+    assert data == line + LF
+
+
+def test_columns_truncate_left_text_to_keep_a_space_before_the_right():
+    data = render(tickets.columns("{name}", "$9.99"), name="X" * 60)
+    line = data[:-1]
+    assert len(line) == LINE_WIDTH
+    assert line == b"X" * (LINE_WIDTH - 6) + b" $9.99"
+
+
+def test_text_is_encoded_in_the_printer_codepage():
+    assert render(tickets.text("Café")) == "Café".encode("cp437") + LF
+    assert render(tickets.text("Café"), escpos=False) == "Café".encode("utf-8") + LF
+
+
+@pytest.mark.parametrize("table_label", [None, ""])
+def test_when_skips_absent_fields(table_label):
+    op = tickets.when("table_label", tickets.text("Table: {table_label}"))
+    assert render(op, table_label=table_label) == b""
+    assert render(op) == b""
+    assert render(op, table_label="T4") == b"Table: T4\n"
+
+
+def test_section_renders_against_the_nested_context():
+    op = tickets.section("payment", tickets.text("Paid by {method}"))
+    assert render(op, payment={"method": "cash"}) == b"Paid by cash\n"
+    assert render(op, payment=None) == b""
+    assert render(op) == b""
+
+
+def test_each_renders_once_per_element():
+    op = tickets.each("items", tickets.text("{quantity} x {name}"))
+    data = render(op, items=[{"quantity": 2, "name": "Har Gow"}, {"quantity": 1, "name": "Tea"}])
+    assert data == b"2 x Har Gow\n1 x Tea\n"
+    assert render(op, items=[]) == b""
+
+
+def test_rule_spans_the_line():
+    assert render(tickets.rule("=")) == b"=" * LINE_WIDTH + LF
@@ -0,0 +1,290 @@
+"""Compiled ticket templates that render straight to ESC/POS bytes.
+
+A Template is built once from layout ops (text, columns, chinese, each,
+when, section, ...). Format strings are split and their literal parts
+encoded up front, so rendering a ticket is a walk over a list of small
+functions appending to a bytearray. The same template also renders as
+plain UTF-8 text for driver printers.
+"""
+from string import Formatter
+import threading
+
+LINE_WIDTH = 42
+TEXT_ENCODING = "cp437"
+CHINESE_ENCODING = "gb18030"
+
+INIT = b"\x1b@"
+LF = b"\n"
+BOLD_ON = b"\x1bE\x01"
+BOLD_OFF = b"\x1bE\x00"
+DOUBLE_HEIGHT = b"\x1d!\x01"
+NORMAL_SIZE = b"\x1d!\x00"
+ALIGN_LEFT = b"\x1ba\x00"
+ALIGN_CENTER = b"\x1ba\x01"
+CHINESE_ON = b"\x1c&"
+CHINESE_OFF = b"\x1c."
+FEED_AND_CUT = b"\x1dV\x42\x03"
+
+_formatter = Formatter()
+_local = threading.local()
+
+
+def compile_format(template):
+    """Split a format string into pre-parsed (literal, field, spec) parts."""
+    parts = []
+    for literal, field, spec, _ in _formatter.parse(template):
+        parts.append((literal, field, spec or ""))
+    if len(parts) == 1 and parts[0][1] is None:
+        literal = parts[0][0]
+        return lambda context: literal
+
+    def render(context):
+        pieces = []
+        for literal, field, spec in parts:
+            pieces.append(literal)
+            if field is not None:
+                pieces.append(format(context[field], spec))
+        return "".join(pieces)
+
+    return render
+
+
+class Mode:
+    """How a template is emitted: ESC/POS commands or plain text."""
+
+    def __init__(self, escpos, width=LINE_WIDTH):
+        self.escpos = escpos
+        self.width = width
+        self.encoding = TEXT_ENCODING if escpos else "utf-8"
+        self.chinese_encoding = CHINESE_ENCODING if escpos else "utf-8"
+
+    def encode(self, text):
+        return text.encode(self.encoding, "replace")
+
+    def styled(self, bold, tall, center):
+        """(prefix, suffix) command bytes for a styled line."""
+        if not self.escpos:
+            return b"", b""
+        prefix = bytearray()
+        suffix = bytearray()
+        if center:
+            prefix += ALIGN_CENTER
+            suffix += ALIGN_LEFT
+        if bold:
+            prefix += BOLD_ON
+            suffix += BOLD_OFF
+        if tall:
+            prefix += DOUBLE_HEIGHT
+            suffix += NORMAL_SIZE
+        return bytes(prefix), bytes(suffix)
+
+
+class Text:
+    def __init__(self, template, bold=False, tall=False, center=False):
+        self.render = compile_format(template)
+        self.style = (bold, tall, center)
+
+    def compile(self, mode):
+        render = self.render
+        prefix, suffix = mode.styled(*self.style)
+        suffix += LF
+        center = self.style[2] and not mode.escpos
+        width = mode.width
+
+        def emit(context, out):
+            text = render(context)
+            if center:
+                text = text.center(width).rstrip()
+            out += prefix
+            out += mode.encode(text)
+            out += suffix
+
+        return emit
+
+
+class Columns:
+    """A line with left-aligned and right-aligned text, padded to the width."""
+
+    def __init__(self, left, right, bold=False, tall=False):
+        self.left = compile_format(left)
+        self.right = compile_format(right)
+        self.style = (bold, tall, False)
+
+    def compile(self, mode):
+        left, right = self.left, self.right
+        prefix, suffix = mode.styled(*self.style)
+        suffix += LF
+        width = mode.width
+
+        def emit(context, out):
+            right_text = right(context)
+            left_text = left(context)[: max(width - len(right_text) - 1, 0)]
+            out += prefix
+            out += mode.encode(left_text.ljust(width - len(right_text)) + right_text)
+            out += suffix
+
+        return emit
+
+
+class Chinese:
+    """A line in the printer's Chinese codepage; skipped when the field is empty."""
+
+    def __init__(self, field, indent=0, tall=False):
+        self.field = field
+        self.indent = " " * indent
+        self.tall = tall
+
+    def compile(self, mode):
+        field, indent = self.field, mode.encode(self.indent)
+        prefix, suffix = mode.styled(False, self.tall, False)
+        if mode.escpos:
+            prefix += CHINESE_ON
+            suffix = CHINESE_OFF + suffix
+        suffix += LF
+
+        def emit(context, out):
+            value = context.get(field)
+            if not value:
+                return
+            out += indent
+            out += prefix
+            out += value.encode(mode.chinese_encoding, "replace")
+            out += suffix
+
+        return emit
+
+
+class Raw:
+    def __init__(self, escpos_bytes, text_bytes=b""):
+        self.escpos_bytes = escpos_bytes
+        self.text_bytes = text_bytes
+
+    def compile(self, mode):
+        data = self.escpos_bytes if mode.escpos else self.text_bytes
+
+        def emit(context, out):
+            out += data
+
+        return emit
+
+
+class Rule:
+    def __init__(self, char="-"):
+        self.char = char
+
+    def compile(self, mode):
+        line = mode.encode(self.char * mode.width) + LF
+
+        def emit(context, out):
+            out += line
+
+        return emit
+
+
+class Group:
+    def __init__(self, key, ops):
+        self.key = key
+        self.ops = ops
+
+    def compile_body(self, mode):
+        return [op.compile(mode) for op in self.ops]
+
+
+class Each(Group):
+    """Render the ops once per element of context[key]."""
+
+    def compile(self, mode):
+        body, key = self.compile_body(mode), self.key
+
+        def emit(context, out):
+            for element in context.get(key) or ():
+                for op in body:
+                    op(element, out)
+
+        return emit
+
+
+class When(Group):
+    """Render the ops against the same context when context[key] is truthy."""
+
+    def compile(self, mode):
+        body, key = self.compile_body(mode), self.key
+
+        def emit(context, out):
+            if context.get(key):
+                for op in body:
+                    op(context, out)
+
+        return emit
+
+
+class Section(Group):
+    """Render the ops against the nested context[key] when it is present."""
+
+    def compile(self, mode):
+        body, key = self.compile_body(mode), self.key
+
+        def emit(context, out):
+            nested = context.get(key)
+            if nested:
+                for op in body:
+                    op(nested, out)
+
+        return emit
+
+
+def text(template, bold=False, tall=False, center=False):
+    return Text(template, bold=bold, tall=tall, center=center)
+
+
+def columns(left, right, bold=False, tall=False):
+    return Columns(left, right, bold=bold, tall=tall)
+
+
+def chinese(field, indent=0, tall=False):
+    return Chinese(field, indent=indent, tall=tall)
+
+
+def blank():
+    return Raw(LF, LF)
+
+
+def rule(char="-"):
+    return Rule(char)
+
+
+def each(key, *ops):
+    return Each(key, ops)
+
+
+def when(key, *ops):
+    return When(key, ops)
+
+
+def section(key, *ops):
+    return Section(key, ops)
+
+
+class Template:
+    def __init__(self, *ops, width=LINE_WIDTH):
+        ops = (Raw(INIT),) + ops + (Raw(LF * 3 + FEED_AND_CUT),)
+        self.programs = {
+            True: [op.compile(Mode(True, width)) for op in ops],
+            False: [op.compile(Mode(False, width)) for op in ops],
+        }
+
+    def render(self, context, out, escpos=True):
+        """Append the rendered ticket to `out` and return it."""
+        for op in self.programs[escpos]:
+            op(context, out)
+        return out
+
+
+def render_bytes(template, context, escpos=True):
+    """Render into this thread's reusable buffer and return a bytes copy."""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = bytearray()
+    del buffer[:]
+    template.render(context, buffer, escpos=escpos)
+    return bytes(buffer)